@@ -0,0 +1,200 @@
+"""A stand-in for the Typeform API that runs inside the process, as a
+requests transport adapter mounted on the tap's session. It serves
+synthetic /forms, /forms/{id} and /forms/{id}/responses payloads and can add
+latency and inject 429 responses.
+
+    adapter = FakeTypeformAdapter(forms=10, responses_per_form=5000)
+    atx.client.session.mount('https://', adapter)
+"""
+import bisect
+import collections
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from urllib3.response import HTTPResponse
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# (field type, answer type, value for the nth response)
+ANSWER_KINDS = [
+    ('short_text', 'text', lambda n: 'answer number {}'.format(n)),
+    ('multiple_choice', 'choice', lambda n: {'label': 'Option {}'.format(n % 4)}),
+    ('multiple_choice', 'choices', lambda n: {'labels': ['Option {}'.format(n % 3), 'Other']}),
+    ('number', 'number', lambda n: n % 100),
+    ('yes_no', 'boolean', lambda n: n % 2 == 0),
+    ('email', 'email', lambda n: 'user{}@example.com'.format(n)),
+    ('date', 'date', lambda n: '2020-01-{:02d}'.format(n % 28 + 1)),
+    ('long_text', 'text', lambda n: 'lorem ipsum dolor sit amet ' * 8),
+]
+
+
+class FakeTypeformAdapter(HTTPAdapter):
+    """Answers every request the tap makes from generated data.
+
+    Each form has `responses_per_form` responses submitted `interval` apart
+    from `first_submitted_at`, each with `answers_per_response` answers.
+    Every request sleeps for `latency` seconds, and a `throttle_rate`
+    fraction of them get a 429 with a Retry-After of `retry_after` seconds.
+    Pages of more than `max_page_size` responses fail with a 504, the way
+    the api does for heavy forms. Form listings and definitions carry an
+    ETag and get a 304 when it is sent back in If-None-Match. Bodies are
+    gzipped when the request accepts it, and can be streamed.
+    """
+
+    def __init__(self, forms=10, responses_per_form=1000, answers_per_response=10,
+                 latency=0.0, throttle_rate=0.0, retry_after=1, max_page_size=None,
+                 first_submitted_at=datetime.datetime(2020, 1, 1),
+                 interval=datetime.timedelta(minutes=5), seed=0):
+        super().__init__()
+        self.form_ids = ['form{:05d}'.format(i) for i in range(forms)]
+        self.responses_per_form = responses_per_form
+        self.answers_per_response = answers_per_response
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_page_size = max_page_size
+        self.submitted_at = [(first_submitted_at + interval * n).strftime(DATE_FORMAT)
+                             for n in range(responses_per_form)]
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.throttled = 0
+        self.timed_out = 0
+        self.not_modified = 0
+
+    def send(self, request, **kwargs): # pylint: disable=arguments-differ
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(request.url)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.strip('/').split('/')
+
+        with self.lock:
+            throttle = self.throttle_rate and self.random.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if throttle:
+            return self.respond(request, 429, {'code': 'TOO_MANY_REQUESTS'},
+                                {'Retry-After': str(self.retry_after)})
+
+        if path == ['forms']:
+            endpoint, body = 'forms', self.forms_page(params)
+        elif len(path) == 2:
+            endpoint, body = 'definition', self.definition(path[1])
+        elif len(path) == 3 and path[2] == 'responses':
+            if self.max_page_size and int(params.get('page_size', 25)) > self.max_page_size:
+                with self.lock:
+                    self.timed_out += 1
+                return self.respond(request, 504, {'code': 'GATEWAY_TIMEOUT'})
+            endpoint, body = 'responses', self.responses_page(path[1], params)
+        else:
+            return self.respond(request, 404, {'code': 'NOT_FOUND'})
+        with self.lock:
+            self.requests[endpoint] += 1
+        if endpoint == 'responses':
+            return self.respond(request, 200, body)
+        etag = '"{}"'.format(hashlib.sha1(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest())
+        if request.headers.get('If-None-Match') == etag:
+            with self.lock:
+                self.not_modified += 1
+            return self.respond(request, 304, None, {'ETag': etag})
+        return self.respond(request, 200, body, {'ETag': etag})
+
+    def respond(self, request, status_code, body, headers=None):
+        response = Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response.headers.update(headers or {})
+        content = b'' if body is None else json.dumps(body).encode('utf-8')
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content, compresslevel=1)
+            response.headers['Content-Encoding'] = 'gzip'
+        response.raw = HTTPResponse(body=io.BytesIO(content), headers=response.headers, status=status_code,
+                                    preload_content=False, decode_content=True)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def forms_page(self, params):
+        page = int(params.get('page', 1))
+        page_size = int(params.get('page_size', 10))
+        form_ids = self.form_ids[(page - 1) * page_size:page * page_size]
+        return {
+            'total_items': len(self.form_ids),
+            'page_count': -(-len(self.form_ids) // page_size),
+            'items': [{
+                'id': form_id,
+                'type': 'quiz',
+                'title': 'Form {}'.format(form_id),
+                'last_updated_at': '2020-01-01T00:00:00Z',
+                'settings': {'is_public': True, 'is_trial': False},
+                'self': {'href': 'https://api.typeform.com/forms/{}'.format(form_id)},
+                'theme': {'href': 'https://api.typeform.com/themes/default'},
+                '_links': {'display': 'https://example.typeform.com/to/{}'.format(form_id)},
+            } for form_id in form_ids]
+        }
+
+    def question(self, index):
+        field_type = ANSWER_KINDS[index % len(ANSWER_KINDS)][0]
+        return {'id': 'field{}'.format(index), 'ref': 'ref{}'.format(index), 'type': field_type}
+
+    def definition(self, form_id):
+        return {
+            'id': form_id,
+            'last_updated_at': '2020-01-01T00:00:00Z',
+            'fields': [dict(self.question(index), title='Question {}'.format(index))
+                       for index in range(self.answers_per_response)]
+        }
+
+    def response(self, form_id, n):
+        answers = []
+        for index in range(self.answers_per_response):
+            _, answer_type, value = ANSWER_KINDS[index % len(ANSWER_KINDS)]
+            answers.append({'field': self.question(index), 'type': answer_type, answer_type: value(n)})
+        return {
+            'landing_id': '{}-{:09d}'.format(form_id, n),
+            'token': '{}-{:09d}'.format(form_id, n),
+            'response_id': '{}-{:09d}'.format(form_id, n),
+            'landed_at': self.submitted_at[n],
+            'submitted_at': self.submitted_at[n],
+            'metadata': {
+                'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)',
+                'platform': 'other',
+                'referer': 'https://example.typeform.com/to/{}'.format(form_id),
+                'network_id': 'network{}'.format(n % 50),
+                'browser': 'default',
+            },
+            'hidden': {'utm_source': 'benchmark'},
+            'calculated': {'score': 0},
+            'answers': answers,
+        }
+
+    def responses_page(self, form_id, params):
+        # responses are generated in submitted_at order, which is also the
+        # order of their tokens
+        first = 0
+        last = self.responses_per_form
+        if 'since' in params:
+            first = bisect.bisect_left(self.submitted_at, params['since'])
+        if 'until' in params:
+            last = bisect.bisect_right(self.submitted_at, params['until'])
+        if 'after' in params:
+            first = max(first, int(params['after'].rsplit('-', 1)[1]) + 1)
+        page_size = int(params.get('page_size', 25))
+        matching = range(first, max(first, last))
+        return {
+            'total_items': len(matching),
+            'page_count': -(-len(matching) // page_size),
+            'items': [self.response(form_id, n) for n in matching[:page_size]]
+        }
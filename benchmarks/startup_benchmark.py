@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Times how long the tap takes to start, as a fresh process: importing
+tap_typeform and running `tap-typeform --discover`. Reports the median of
+--runs runs of each and fails when a median is over --target milliseconds.
+
+    python benchmarks/startup_benchmark.py --runs 20 --target 300
+
+`python -X importtime -c "import tap_typeform"` shows where import time
+goes when a number regresses.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = [
+    ('import', [sys.executable, '-c', 'import tap_typeform']),
+    ('discover', [sys.executable, '-c', 'import tap_typeform; tap_typeform.main()', '--discover']),
+]
+
+
+def time_command(command):
+    start = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--target', type=float, help='fail when a median is over this many ms')
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as config_file:
+        json.dump({'token': 'benchmark', 'start_date': '2019-01-01T00:00:00Z'}, config_file)
+    failed = False
+    try:
+        for name, command in COMMANDS:
+            if name == 'discover':
+                command = command + ['--config', config_file.name]
+            # the first run warms the bytecode and file caches
+            time_command(command)
+            runs = [time_command(command) for _ in range(args.runs)]
+            median = statistics.median(runs)
+            print('{:<10} median {:7.1f}ms  min {:7.1f}ms  max {:7.1f}ms'.format(
+                name, median, min(runs), max(runs)))
+            if args.target is not None and median > args.target:
+                failed = True
+    finally:
+        os.unlink(config_file.name)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Runs a full sync against the in-process fake Typeform API from
+fake_typeform.py, without any network access, and reports records/sec, the
+requests issued, peak RSS and the time spent throttled.
+
+    python benchmarks/sync_benchmark.py --forms 20 --responses 5000 --answers 10
+    python benchmarks/sync_benchmark.py --latency 0.05 --throttle-rate 0.01 \\
+        --config '{"max_workers": 4, "requests_per_second": 2}'
+
+Any tap config can be given with --config, by default the tap's rate limit
+is lifted so that the numbers reflect the tap itself.
+"""
+import argparse
+import contextlib
+import json
+import resource
+import sys
+import time
+
+import tap_typeform
+from tap_typeform.context import Context
+
+from fake_typeform import FakeTypeformAdapter
+
+
+class CountingSink(object):
+    """Stands in for stdout, counting what the tap writes to it."""
+
+    def __init__(self, keep_to=None):
+        self.bytes = 0
+        self.messages = 0
+        self.keep_to = keep_to
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.messages += data.count('\n')
+        if self.keep_to is not None:
+            self.keep_to.write(data)
+        return len(data)
+
+    def flush(self):
+        if self.keep_to is not None:
+            self.keep_to.flush()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--forms', type=int, default=10)
+    parser.add_argument('--responses', type=int, default=2000, help='responses per form')
+    parser.add_argument('--answers', type=int, default=10, help='answers per response')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with a 429')
+    parser.add_argument('--retry-after', type=float, default=1, help='Retry-After of the injected 429s')
+    parser.add_argument('--max-page-size', type=int, help='pages of more responses than this fail with a 504')
+    parser.add_argument('--config', default='{}', help='extra tap config, as JSON')
+    parser.add_argument('--state', default='{}', help='initial state, as JSON')
+    parser.add_argument('--output', help='also write the tap output to this file')
+    args = parser.parse_args()
+
+    config = {
+        'token': 'benchmark',
+        'start_date': '2019-01-01T00:00:00Z',
+        'requests_per_second': 1000000,
+        'burst': 1000000,
+    }
+    config.update(json.loads(args.config))
+    adapter = FakeTypeformAdapter(forms=args.forms,
+                                  responses_per_form=args.responses,
+                                  answers_per_response=args.answers,
+                                  latency=args.latency,
+                                  throttle_rate=args.throttle_rate,
+                                  retry_after=args.retry_after,
+                                  max_page_size=args.max_page_size)
+
+    atx = Context(config, json.loads(args.state))
+    atx.client.session.mount('https://', adapter)
+    atx.catalog = tap_typeform.discover(select_all=True)
+
+    output = open(args.output, 'w') if args.output else None
+    sink = CountingSink(output)
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sink):
+            tap_typeform.sync(atx)
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    records = sum(atx.counts.values())
+    rows = [
+        ('records', '{:d} ({})'.format(records, ', '.join(
+            '{} {}'.format(stream_id, count) for stream_id, count in atx.counts.items()))),
+        ('elapsed', '{:.2f}s'.format(elapsed)),
+        ('records/sec', '{:.0f}'.format(records / elapsed if elapsed else 0)),
+        ('requests', '{:d} ({}, {} throttled, {} timed out, {} not modified)'.format(
+            atx.client.request_count,
+            ', '.join('{} {}'.format(endpoint, count) for endpoint, count in sorted(adapter.requests.items())),
+            adapter.throttled, adapter.timed_out, adapter.not_modified)),
+        ('throttled', '{:.2f}s in the rate limiter, {:.2f}s in backoff'.format(
+            atx.client.rate_limiter.throttled_seconds, atx.client.backoff_seconds)),
+        ('output', '{:d} messages, {:.1f} MB'.format(sink.messages, sink.bytes / (1024.0 * 1024.0))),
+        ('peak rss', '{:.1f} MB'.format(peak_rss_mb())),
+    ]
+    width = max(len(name) for name, _ in rows)
+    for name, value in rows:
+        print('{}  {}'.format(name.ljust(width), value))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
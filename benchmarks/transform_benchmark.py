@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Compares records/sec of singer.Transformer with the tap's
+FlatRecordTransformer on synthetic landings and answers records, and checks
+both produce exactly the same output.
+
+    python benchmarks/transform_benchmark.py [--records 50000]
+"""
+import argparse
+import json
+import time
+
+import singer
+from singer import metadata
+
+from tap_typeform import discover
+from tap_typeform.streams import FlatRecordTransformer
+
+
+def landing(i):
+    return {
+        "landing_id": "landing-{}".format(i),
+        "token": "token-{}".format(i),
+        "form_id": "abc123",
+        "landed_at": "2020-01-{:02d}T10:{:02d}:{:02d}Z".format(i % 28 + 1, i % 60, i % 59),
+        "submitted_at": "2020-01-{:02d}T11:{:02d}:{:02d}Z".format(i % 28 + 1, i % 60, i % 59),
+        "user_agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
+        "platform": "other",
+        "referer": "https://example.typeform.com/to/abc123",
+        "network_id": "5f1b2c",
+        "browser": "default",
+        "hidden": "" if i % 2 else json.dumps({"utm_source": "newsletter"}),
+    }
+
+
+def answer(i):
+    return {
+        "landing_id": "landing-{}".format(i // 20),
+        "question_id": "question-{}".format(i % 20),
+        "type": "multiple_choice",
+        "form_id": "abc123",
+        "ref": "ref-{}".format(i % 20),
+        "data_type": "choice",
+        "answer": json.dumps({"label": "Option {}".format(i % 4)}),
+        "submitted_at": "2020-01-{:02d}T11:{:02d}:{:02d}Z".format(i // 20 % 28 + 1, i // 20 % 60, i // 20 % 59),
+    }
+
+
+def run(transform, records):
+    start = time.perf_counter()
+    output = [transform(dict(rec)) for rec in records]
+    return output, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=50000)
+    args = parser.parse_args()
+
+    catalog = discover()
+    for stream_id, make_record in [('landings', landing), ('answers', answer)]:
+        catalog_entry = catalog.get_stream(stream_id)
+        stream_metadata = metadata.to_map(catalog_entry.metadata)
+        stream_schema = catalog_entry.schema.to_dict()
+        records = [make_record(i) for i in range(args.records)]
+
+        transformer = singer.Transformer()
+        generic, generic_secs = run(
+            lambda rec: transformer.transform(rec, stream_schema, stream_metadata), records)
+        flat, flat_secs = run(
+            FlatRecordTransformer(catalog_entry, stream_metadata, singer.Transformer()).transform, records)
+
+        assert [json.dumps(rec) for rec in flat] == [json.dumps(rec) for rec in generic], \
+            'output differs for {}'.format(stream_id)
+        print('{:<9} singer.Transformer {:>9.0f} records/s   FlatRecordTransformer {:>9.0f} records/s   x{:.1f}'.format(
+            stream_id,
+            args.records / generic_secs,
+            args.records / flat_secs,
+            generic_secs / flat_secs))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,10 +12,14 @@ setup(
     install_requires=[
         "singer-python==5.4.0",
         "pendulum",
-        "ratelimit",
         "backoff==1.3.2",
         "requests==2.26.0",
     ],
+    extras_require={
+        "orjson": ["orjson"],
+        "ijson": ["ijson>=3.1"],
+        "parquet": ["pyarrow>=7"],
+    },
     entry_points="""
     [console_scripts]
     tap-typeform=tap_typeform:main
@@ -8,8 +8,9 @@ import singer
 from singer import utils, metadata
 from singer.catalog import Catalog, CatalogEntry, Schema
 
-from tap_typeform import schemas, streams
-from tap_typeform.context import Context
+# streams and context (with requests, backoff and the http client) are only
+# imported once we know we are syncing, discovery doesn't need them
+from tap_typeform import schemas, timing
 
 REQUIRED_CONFIG_KEYS = ["token"]
 
@@ -26,7 +27,7 @@ LOGGER = singer.get_logger()
 #  atx in here since the schema is from file but we would use it if we
 #  pulled schema from the API def discover(atx):
 
-def discover():
+def discover(select_all=False):
     catalog = Catalog([])
     for tap_stream_id in schemas.STATIC_SCHEMA_STREAM_IDS:
         schema = Schema.from_dict(schemas.load_schema(tap_stream_id))
@@ -34,6 +35,8 @@ def discover():
         meta = metadata.write(meta, (), 'table-key-properties', schemas.PK_FIELDS[tap_stream_id])
         replication_key = schemas.REPLICATION_KEY[tap_stream_id]
         meta = metadata.write(meta, (), 'valid-replication-keys', replication_key)
+        if select_all:
+            meta = metadata.write(meta, (), 'selected', True)
 
         for field_name in schema.properties.keys():
             if field_name in schemas.PK_FIELDS[tap_stream_id]:
@@ -80,26 +83,55 @@ def load_schema(tap_stream_id):
 
 
 def sync(atx):
+    from tap_typeform import streams
 
-    streams.sync(atx)
+    with timing.profiled(atx.config):
+        streams.sync(atx)
 
+    atx.timer.write_metrics()
     LOGGER.info('--------------------')
     for stream_name, stream_count in atx.counts.items():
         LOGGER.info('%s: %d', stream_name, stream_count)
+    cache = atx.client.cache
+    if cache is not None:
+        LOGGER.info('http cache: %d hits, %d revalidated', cache.hits, cache.revalidated)
+    if atx.config.get('stage_summary'):
+        LOGGER.info('--------------------')
+        atx.timer.log_summary()
     LOGGER.info('--------------------')
 
 
+def plan(atx):
+    from tap_typeform import streams
+
+    streams.plan(atx)
+
+
 @utils.handle_top_exception(LOGGER)
 def main():
+    if sys.argv[1:2] == ['merge-state']:
+        from tap_typeform import merge_state
+        merge_state.main(sys.argv[2:])
+        return
+
+    # --plan isn't one of singer's own arguments
+    plan_only = '--plan' in sys.argv
+    if plan_only:
+        sys.argv.remove('--plan')
     args = utils.parse_args(REQUIRED_CONFIG_KEYS)
-    atx = Context(args.config, args.state)
     if args.discover:
         catalog = discover()
         catalog.dump()
     else:
+        from tap_typeform.context import Context
+        atx = Context(args.config, args.state)
+        # without a catalog every stream is synced
         atx.catalog = Catalog.from_dict(args.properties) \
-            if args.properties else discover()
-        sync(atx)
+            if args.properties else discover(select_all=True)
+        if plan_only:
+            plan(atx)
+        else:
+            sync(atx)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import singer
+
+LOGGER = singer.get_logger()
+
+# endpoints cached unless http_cache_endpoints says otherwise, responses
+# pages are only ever read once per sync so they're left out
+DEFAULT_CACHED_ENDPOINTS = ['forms', 'definition']
+# seconds a cached body is used without asking the api whether it changed
+DEFAULT_TTL = 0
+DEFAULT_MAX_SIZE_MB = 100
+
+
+class CacheEntry(object):
+
+    def __init__(self, data, etag=None, last_modified=None, stored_at=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at or time.time()
+
+    def age(self):
+        return time.time() - self.stored_at
+
+    def validators(self):
+        """The headers that make a request conditional on the entry having
+        changed."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    """Keeps decoded api responses on disk, one json file per url, params and
+    token under `path`.
+
+    An entry younger than `ttl` seconds is served without making a request.
+    Older ones are revalidated with the ETag / Last-Modified the api sent
+    along with them, and a 304 serves the entry again. Once the files add up
+    to more than `max_size` bytes the least recently stored ones are
+    deleted.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE_MB * 1024 * 1024,
+                 endpoints=DEFAULT_CACHED_ENDPOINTS):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.endpoints = set(endpoints)
+        self.hits = 0
+        self.revalidated = 0
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(size for _, size, _ in self._files())
+
+    @classmethod
+    def from_config(cls, config):
+        """Returns None unless `http_cache_dir` is set."""
+        path = config.get('http_cache_dir')
+        if not path:
+            return None
+        endpoints = config.get('http_cache_endpoints', DEFAULT_CACHED_ENDPOINTS)
+        if isinstance(endpoints, str):
+            endpoints = [endpoint.strip() for endpoint in endpoints.split(',') if endpoint.strip()]
+        return cls(path,
+                   ttl=float(config.get('http_cache_ttl', DEFAULT_TTL)),
+                   max_size=float(config.get('http_cache_max_mb', DEFAULT_MAX_SIZE_MB)) * 1024 * 1024,
+                   endpoints=endpoints)
+
+    def caches(self, endpoint):
+        return endpoint in self.endpoints
+
+    def key(self, token, url, params):
+        # the token is part of the key so that accounts sharing a cache
+        # directory never see each other's forms
+        raw = json.dumps([token, url, sorted((params or {}).items())])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def _files(self):
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.json') and entry.is_file():
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        try:
+            with open(self._file(key)) as cache_file:
+                return CacheEntry(**json.load(cache_file))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError):
+            LOGGER.warning('Ignoring unreadable http cache entry %s', key)
+            return None
+
+    def put(self, key, entry):
+        path = self._file(key)
+        body = json.dumps({'data': entry.data, 'etag': entry.etag,
+                           'last_modified': entry.last_modified, 'stored_at': entry.stored_at})
+        with self.lock:
+            try:
+                self.size -= os.path.getsize(path)
+            except OSError:
+                pass
+            # written next to the entry and moved over it, so a reader never
+            # sees half a file
+            temp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+            with open(temp_path, 'w') as cache_file:
+                cache_file.write(body)
+            os.replace(temp_path, path)
+            self.size += len(body)
+            if self.size > self.max_size:
+                self._evict()
+
+    def touch(self, key, entry):
+        """Marks an entry the api said hasn't changed as fresh again."""
+        entry.stored_at = time.time()
+        self.put(key, entry)
+
+    def _evict(self):
+        files = sorted(self._files(), key=lambda file: file[2])
+        self.size = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
@@ -1,25 +1,229 @@
+import json
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
 import backoff
 import singer
+from singer import metrics
+
+from tap_typeform.cache import CacheEntry, ResponseCache
+from tap_typeform.timing import StageTimer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 LOGGER = singer.get_logger()
 
+# typeform allows 2 requests per second per account
+DEFAULT_REQUESTS_PER_SECOND = 2
+DEFAULT_BURST = 2
+# never slow down below one request every 10 seconds after a 429
+MIN_REQUESTS_PER_SECOND = 0.1
+# number of successful requests, or seconds without a 429, before the rate
+# creeps back up after a 429. the seconds keep a rate that has fallen low
+# from taking minutes to recover
+RECOVERY_REQUESTS = 20
+RECOVERY_SECONDS = 10
+# connections kept open per host, raised to max_workers when that is bigger
+DEFAULT_POOL_MAXSIZE = 10
+# seconds to wait for the api to start answering a request
+DEFAULT_REQUEST_TIMEOUT = 300
+
+
+def decode_json(content):
+    """Decodes a response body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
 class RateLimitException(Exception):
     pass
 
 class MetricsRateLimitException(Exception):
     pass
 
+class ServerErrorException(Exception):
+    """A request timed out or failed with a 500 or 504, which is what the
+    api does when it is asked for too much at once."""
+
+def parse_retry_after(value):
+    """Returns the number of seconds a Retry-After header asks us to wait,
+    it can either be a number of seconds or an http date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+class TokenBucket(object):
+    """Token bucket limiter shared by every request a Client makes.
+
+    Tokens refill at `rate` per second up to `capacity`, and each request
+    takes one. When the API answers with a 429 the bucket is emptied, held
+    until the Retry-After delay has passed and the rate is halved, it then
+    climbs back towards the configured rate as requests keep succeeding.
+
+    A caller short of a token takes it anyway, leaving the bucket below
+    zero, and sleeps without holding the lock until the refill covers it.
+    Callers behind it queue up further below zero. A 429 while they sleep
+    drops those reservations and they take their tokens again at the
+    lowered rate.
+    """
+    def __init__(self, rate, capacity):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        # in the future while a Retry-After delay is being waited out
+        self.updated_at = time.monotonic()
+        self.throttles = 0
+        self.successes = 0
+        # when the rate last changed
+        self.changed_at = time.monotonic()
+        self.throttled_seconds = 0.0
+        # when the last reservation taken so far comes due
+        self.reserved_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def acquire(self):
+        """Takes a token, waiting for one if needed. Returns the number of
+        seconds spent waiting and the throttle count the token was taken
+        under, which is handed back to throttle() if the request gets a
+        429."""
+        requested_at = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                self.tokens -= 1
+                wait = max(self.updated_at - now, 0) + max(-self.tokens, 0) / self.rate
+                throttles = self.throttles
+                # callers wait side by side, only the time added to the
+                # queue of reservations counts as time spent throttled
+                self.throttled_seconds += max(now + wait - max(now, self.reserved_until), 0)
+                self.reserved_until = max(self.reserved_until, now + wait)
+            if wait <= 0:
+                return now - requested_at, throttles
+            time.sleep(wait)
+            # the token is ours unless a 429 emptied the bucket meanwhile
+            if self.throttles == throttles:
+                return time.monotonic() - requested_at, throttles
+
+    def success(self):
+        # only ever below max_rate for a while after a 429, checked without
+        # the lock so that finished requests don't contend for it otherwise
+        if self.rate >= self.max_rate:
+            return
+        with self.lock:
+            if self.rate >= self.max_rate:
+                return
+            self.successes += 1
+            now = time.monotonic()
+            if self.successes >= RECOVERY_REQUESTS or now - self.changed_at >= RECOVERY_SECONDS:
+                self.successes = 0
+                self.changed_at = now
+                self.rate = min(self.max_rate, self.rate * 1.5)
+                LOGGER.info('Request rate raised to %.2f/s', self.rate)
+
+    def throttle(self, retry_after=None, throttles=None):
+        """Slows down after a 429. Requests already in flight when the quota
+        runs out all get one, so a 429 for a request whose token was taken
+        before the last throttle (`throttles` as returned by acquire) is part
+        of the same event and only extends the Retry-After delay."""
+        with self.lock:
+            now = time.monotonic()
+            if throttles is not None and throttles != self.throttles:
+                if retry_after:
+                    self.updated_at = max(self.updated_at, now + retry_after)
+                return
+            self.throttles += 1
+            self.successes = 0
+            self.changed_at = now
+            self.rate = max(MIN_REQUESTS_PER_SECOND, self.rate / 2)
+            if retry_after:
+                # nothing refills until the delay is over, then one request
+                # may go straight away
+                self.tokens = 1
+                self.updated_at = max(self.updated_at, now + retry_after)
+            else:
+                self.tokens = 0
+                self.updated_at = max(self.updated_at, now)
+            LOGGER.warning('Rate limited by the API, request rate lowered to %.2f/s%s',
+                           self.rate,
+                           ' for {:.1f}s'.format(retry_after) if retry_after else '')
+
+
+def record_backoff(details):
+    # keeps track of the time spent waiting to retry
+    client = details['args'][0]
+    client.backoff_seconds += details['wait']
+    client.timer.add('backoff', details['wait'])
+
+
+def iter_items(response):
+    """Parses the items of a streamed response as its body comes in. The body
+    is decompressed on the fly when the api gzipped it. A connection lost
+    half way raises ServerErrorException, like a timeout would."""
+    response.raw.decode_content = True
+    try:
+        yield from ijson.items(response.raw, 'items.item', use_float=True)
+    except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, IOError, ijson.JSONError) as exc:
+        LOGGER.warning('responses download failed - {}'.format(exc))
+        raise ServerErrorException() from exc
+    finally:
+        response.close()
+
+
 class Client(object):
 
     # BASE_URL = 'https://api.typeform.com/forms/FORM_ID/responses'
 
     BASE_URL = 'https://api.typeform.com/forms'
 
-    def __init__(self, config):
+    def __init__(self, config, timer=None):
         self.token = 'Bearer ' + config.get('token')
+        self.timer = timer or StageTimer()
         self.metric = config.get('metric')
+        self.request_count = 0
+        self.backoff_seconds = 0.0
         self.session = requests.Session()
+        pool_maxsize = int(config.get('pool_maxsize', max(DEFAULT_POOL_MAXSIZE, int(config.get('max_workers', 1)))))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if not config.get('keep_alive', True):
+            self.session.headers['Connection'] = 'close'
+        self.request_timeout = float(config.get('request_timeout', DEFAULT_REQUEST_TIMEOUT))
+        self.cache = ResponseCache.from_config(config)
+        self.stream_responses = bool(config.get('stream_responses', False))
+        if self.stream_responses and ijson is None:
+            raise Exception('stream_responses is set but ijson is not installed, `pip install tap-typeform[ijson]`')
+        self.rate_limiter = TokenBucket(
+            float(config.get('requests_per_second', DEFAULT_REQUESTS_PER_SECOND)),
+            float(config.get('burst', DEFAULT_BURST)))
 
     def url(self, form_id):
         #return self.BASE_URL.replace("FORM_ID", form_id)
@@ -32,8 +236,17 @@ class Client(object):
     @backoff.on_exception(backoff.expo,
                           RateLimitException,
                           max_tries=10,
-                          factor=2)
-    def request(self, method, form_id, **kwargs):
+                          factor=2,
+                          on_backoff=record_backoff)
+    def request(self, method, form_id, last_updated_at=None, stream_items=False, **kwargs):
+        """Returns the decoded body of the response. With the http cache on,
+        a cached body is returned without a request while it is younger than
+        the cache ttl, or when `last_updated_at` is given and matches the
+        body's own last_updated_at.
+
+        With `stream_items` the body isn't read here, instead an iterator
+        over its `items` is returned that parses them one at a time as the
+        body is downloaded."""
         # note that typeform response api doesn't return limit headers
 
         if 'headers' not in kwargs:
@@ -43,22 +256,69 @@ class Client(object):
 
         # if we're just pulling the form definition, strip the rest of the url
         if 'params' not in kwargs:
-            response = requests.request(method, self.url(form_id).replace('/responses', ''), **kwargs)
+            endpoint = 'definition'
+            url = self.url(form_id).replace('/responses', '')
         else:
-            response = requests.request(method, self.url(form_id), **kwargs)
+            endpoint = 'forms' if form_id == 'forms' else 'responses'
+            url = self.url(form_id)
+
+        cache_key = cached = None
+        if self.cache is not None and method == 'get' and not stream_items and self.cache.caches(endpoint):
+            cache_key = self.cache.key(self.token, url, kwargs.get('params'))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if cached.age() < self.cache.ttl or (
+                        last_updated_at is not None and cached.data.get('last_updated_at') == last_updated_at):
+                    self.cache.hits += 1
+                    return cached.data
+                kwargs['headers'].update(cached.validators())
 
-        if response.status_code in [429, 502, 503]:
+        waited, throttles = self.rate_limiter.acquire()
+        self.timer.add('rate_limit', waited)
+        self.request_count += 1
+
+        with metrics.http_request_timer(endpoint) as timer, self.timer.time('http'):
+            try:
+                response = self.session.request(method, url, timeout=self.request_timeout, stream=stream_items,
+                                                **kwargs)
+            except requests.exceptions.Timeout as exc:
+                LOGGER.warning('{} request timed out - {}'.format(endpoint, exc))
+                raise ServerErrorException() from exc
+            timer.tags[metrics.Tag.http_status_code] = response.status_code
+
+        if response.status_code == 429:
+            self.rate_limiter.throttle(parse_retry_after(response.headers.get('Retry-After')), throttles)
+            raise RateLimitException()
+        if response.status_code in [502, 503]:
             raise RateLimitException()
         if response.status_code == 423:
             raise MetricsRateLimitException()
+        if response.status_code == 304 and cached is not None:
+            self.rate_limiter.success()
+            self.cache.revalidated += 1
+            self.cache.touch(cache_key, cached)
+            return cached.data
+        if response.status_code in [500, 504]:
+            LOGGER.warning('{} - {}'.format(response.status_code, response.text))
+            raise ServerErrorException()
         try:
             response.raise_for_status()
         except:
             LOGGER.error('{} - {}'.format(response.status_code, response.text))
             raise
-        if 'total_items' in response.json():
-            LOGGER.info('raw data items= {}'.format(response.json()['total_items']))
-        return response.json()
+        self.rate_limiter.success()
+        if stream_items:
+            return iter_items(response)
+        # the body is decoded exactly once
+        with self.timer.time('json_decode'):
+            data = decode_json(response.content)
+        if cache_key is not None:
+            self.cache.put(cache_key, CacheEntry(data,
+                                                 etag=response.headers.get('ETag'),
+                                                 last_modified=response.headers.get('Last-Modified')))
+        if 'total_items' in data:
+            LOGGER.info('raw data items= {}'.format(data['total_items']))
+        return data
 
     def get(self, form_id, **kwargs):
         return self.request('get', form_id, **kwargs)
@@ -1,9 +1,18 @@
+import time
 from datetime import datetime, date
 
 import singer
 from singer import bookmarks as bks_, metadata
 
 from  tap_typeform.client import Client
+from tap_typeform.output import get_output
+from tap_typeform.timing import StageTimer
+
+# every STATE message finishes the files records are being written to with
+# output_dir, so unless the config says otherwise the state is written at
+# most this often then
+OUTPUT_DIR_STATE_EVERY_N_RECORDS = 1000000
+OUTPUT_DIR_STATE_EVERY_SECONDS = 600
 
 class Context(object):
     """Represents a collection of global objects necessary for performing
@@ -12,18 +21,36 @@ class Context(object):
     - config  - The JSON structure from the config.json argument
     - state   - The mutable state dict that is shared among streams
     - client  - An HTTP client object for interacting with the API
+    - timer   - A StageTimer adding up where the sync spends its time
+    - output  - The MessageWriter every message goes to stdout through, or
+                the BatchFileWriter records go to files through
     - catalog - A singer.catalog.Catalog. Note this will be None during
                 discovery.
     """
     def __init__(self, config, state):
         self.config = config
         self.state = state
-        self.client = Client(config)
+        self.timer = StageTimer()
+        self.client = Client(config, self.timer)
         self._catalog = None
         self.selected_stream_ids = None
         self.now = datetime.utcnow()
         self.stream_map = None
+        self.output = get_output(config)
+        self.stream_writers = {}
         self.counts = {}
+        # how often checkpoint() actually writes the state, by default on
+        # every call
+        default_n_records = default_seconds = 0
+        if config.get('output_dir') and \
+                'state_every_n_records' not in config and 'state_every_seconds' not in config:
+            default_n_records = OUTPUT_DIR_STATE_EVERY_N_RECORDS
+            default_seconds = OUTPUT_DIR_STATE_EVERY_SECONDS
+        self.state_every_n_records = int(config.get('state_every_n_records', default_n_records))
+        self.state_every_seconds = float(config.get('state_every_seconds', default_seconds))
+        self.state_written_at = time.monotonic()
+        self.records_at_last_state = 0
+        self.state_dirty = False
 
     @property
     def catalog(self):
@@ -59,7 +86,31 @@ class Context(object):
         bks_.clear_offset(self.state, tap_stream_id)
 
     def write_state(self):
-        singer.write_state(self.state)
+        self.output.write_message(singer.StateMessage(value=self.state))
+        self.state_written_at = time.monotonic()
+        self.records_at_last_state = sum(self.counts.values())
+        self.state_dirty = False
+
+    def checkpoint(self):
+        """Called whenever the bookmarks in self.state have moved. The state is
+        always current in memory, but it is only written out once
+        state_every_n_records records or state_every_seconds seconds have
+        gone by since the last STATE message."""
+        self.state_dirty = True
+        if not self.state_every_n_records and not self.state_every_seconds:
+            self.write_state()
+            return
+        if self.state_every_n_records and \
+                sum(self.counts.values()) - self.records_at_last_state >= self.state_every_n_records:
+            self.write_state()
+        elif self.state_every_seconds and \
+                time.monotonic() - self.state_written_at >= self.state_every_seconds:
+            self.write_state()
+
+    def flush_state(self):
+        """Writes the state if it has changed since the last STATE message."""
+        if self.state_dirty:
+            self.write_state()
 
     def get_catalog_entry(self, stream_name):
         if not self.stream_map:
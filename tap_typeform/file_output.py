@@ -0,0 +1,261 @@
+import collections
+import datetime
+import gzip
+import json
+import os
+
+import singer
+
+from tap_typeform.output import MessageWriter
+
+# only imported for output_format parquet, pyarrow alone takes tens of MB
+pyarrow = None
+
+LOGGER = singer.get_logger()
+
+DEFAULT_FILE_MAX_MB = 128
+# rows a parquet file buffers before writing them out as a row group
+PARQUET_ROW_GROUP_SIZE = 50000
+# rows all open parquet files buffer between them, past that the biggest
+# buffer is written out as a smaller row group
+PARQUET_MAX_BUFFERED_ROWS = 100000
+# files kept open at once, the least recently written to is finished first
+DEFAULT_MAX_OPEN_FILES = 64
+MANIFEST = 'manifest.json'
+
+
+class JsonlFile(object):
+    """A gzipped file of records, one json object per line."""
+
+    extension = '.jsonl.gz'
+
+    def __init__(self, path, schema, dumps):
+        self.raw = open(path, 'wb')
+        self.file = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=1)
+        self.dumps = dumps
+
+    def write(self, record):
+        self.file.write((self.dumps(record) + '\n').encode('utf-8'))
+
+    def buffered(self):
+        return 0
+
+    def size(self):
+        return self.raw.tell()
+
+    def close(self):
+        self.file.close()
+        self.raw.close()
+
+
+def get_arrow_type(json_schema):
+    types = json_schema.get('type', [])
+    types = set(types) if isinstance(types, list) else {types}
+    if types - {'null'} == {'integer'}:
+        return pyarrow.int64()
+    if types - {'null'} == {'number'}:
+        return pyarrow.float64()
+    if types - {'null'} == {'boolean'}:
+        return pyarrow.bool_()
+    # date-times are kept as the strings the tap would have written
+    return pyarrow.string()
+
+
+class ParquetFile(object):
+    """A parquet file with a column per property of the stream's schema,
+    written a row group at a time."""
+
+    extension = '.parquet'
+
+    def __init__(self, path, schema, dumps):
+        self.raw = open(path, 'wb')
+        self.fields = list(schema['properties'])
+        self.arrow_schema = pyarrow.schema([(field, get_arrow_type(schema['properties'][field]))
+                                            for field in self.fields])
+        self.string_fields = [field for field in self.fields
+                              if self.arrow_schema.field(field).type == pyarrow.string()]
+        self.writer = pyarrow.parquet.ParquetWriter(self.raw, self.arrow_schema)
+        self.dumps = dumps
+        self.rows = []
+
+    def write(self, record):
+        for field in self.string_fields:
+            value = record.get(field)
+            if value is not None and not isinstance(value, str):
+                record[field] = self.dumps(value)
+        self.rows.append(record)
+        if len(self.rows) >= PARQUET_ROW_GROUP_SIZE:
+            self.write_row_group()
+
+    def buffered(self):
+        return len(self.rows)
+
+    def write_row_group(self):
+        if self.rows:
+            self.writer.write_table(pyarrow.Table.from_pylist(self.rows, schema=self.arrow_schema))
+            self.rows = []
+
+    def size(self):
+        return self.raw.tell()
+
+    def close(self):
+        self.write_row_group()
+        self.writer.close()
+        self.raw.close()
+
+
+def import_pyarrow():
+    """Returns False when pyarrow isn't installed."""
+    global pyarrow # pylint: disable=global-statement
+    try:
+        import pyarrow.parquet # pylint: disable=redefined-outer-name,import-outside-toplevel
+    except ImportError:
+        return False
+    return True
+
+
+FILE_FORMATS = {
+    'jsonl': JsonlFile,
+    'parquet': ParquetFile,
+}
+
+
+class BatchFileWriter(object):
+    """Writes records to files under `output_dir` instead of stdout, one
+    directory per stream and a file per stream and form. SCHEMA and STATE
+    messages still go to stdout, so the sync can be resumed as usual.
+
+    Files are gzipped jsonl (`output_format` jsonl, the default) or parquet
+    (`output_format` parquet, needs pyarrow). A file is finished once it
+    reaches `output_file_max_mb` or when a STATE message is written, so
+    every record a STATE covers is in a finished file. Finished files are
+    listed in the directory's manifest.json along with the stream schemas.
+
+    A form's files are also finished once the form is done (see
+    finish_form), and no more than `output_max_open_files` (default 64)
+    are ever open, the least recently written to is finished to make
+    room for a new one. Finishing a file early only means more of them.
+    """
+
+    def __init__(self, config):
+        if int(config.get('transform_processes', 0)) > 0:
+            raise Exception('transform_processes can not be used with output_dir')
+        file_format = config.get('output_format', 'jsonl')
+        if file_format not in FILE_FORMATS:
+            raise Exception('unknown output_format {}, use {}'.format(file_format, ' or '.join(FILE_FORMATS)))
+        if file_format == 'parquet' and not import_pyarrow():
+            raise Exception('output_format is parquet but pyarrow is not installed, '
+                            '`pip install tap-typeform[parquet]`')
+        self.file_class = FILE_FORMATS[file_format]
+        self.directory = config['output_dir']
+        self.max_bytes = float(config.get('output_file_max_mb', DEFAULT_FILE_MAX_MB)) * 1024 * 1024
+        self.max_open_files = max(int(config.get('output_max_open_files', DEFAULT_MAX_OPEN_FILES)), 1)
+        self.messages = MessageWriter(config)
+        self.dumps = self.messages.dumps
+        # files from several runs end up in the same directories, the time
+        # the run started keeps their names apart
+        self.run_id = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        self.sequence = 0
+        # oldest write first
+        self.files = collections.OrderedDict()
+        self.buffered_rows = 0
+        self.schemas = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest_path = os.path.join(self.directory, MANIFEST)
+        self.manifest = {'streams': {}, 'files': []}
+        self.manifest_changed = False
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as manifest_file:
+                self.manifest = json.load(manifest_file)
+
+    def record_format(self, stream, time_extracted=None):
+        return stream
+
+    def write_record(self, record, stream):
+        # every record but those of the forms stream belongs to a form
+        key = (stream, record.get('form_id'))
+        batch_file = self.files.get(key)
+        if batch_file is None:
+            batch_file = self.open_file(*key)
+        else:
+            self.files.move_to_end(key)
+        buffered = batch_file['file'].buffered()
+        batch_file['file'].write(record)
+        batch_file['records'] += 1
+        self.buffered_rows += batch_file['file'].buffered() - buffered
+        if batch_file['file'].size() >= self.max_bytes:
+            self.close_file(key)
+        elif self.buffered_rows > PARQUET_MAX_BUFFERED_ROWS:
+            self.write_biggest_buffer()
+
+    def write_biggest_buffer(self):
+        batch_file = max(self.files.values(), key=lambda batch_file: batch_file['file'].buffered())
+        self.buffered_rows -= batch_file['file'].buffered()
+        batch_file['file'].write_row_group()
+
+    def write_serialised(self, text):
+        raise Exception('records serialised as messages can not be written to output_dir')
+
+    def open_file(self, stream, form_id):
+        if len(self.files) >= self.max_open_files:
+            self.close_file(next(iter(self.files)))
+        self.sequence += 1
+        directory = os.path.join(self.directory, stream)
+        os.makedirs(directory, exist_ok=True)
+        name = '-'.join(part for part in [stream, form_id, self.run_id, '{:05d}'.format(self.sequence)] if part)
+        path = os.path.join(directory, name + self.file_class.extension)
+        batch_file = {
+            'path': path,
+            'file': self.file_class(path, self.schemas[stream]['schema'], self.dumps),
+            'records': 0,
+        }
+        self.files[(stream, form_id)] = batch_file
+        return batch_file
+
+    def close_file(self, key):
+        batch_file = self.files.pop(key)
+        self.buffered_rows -= batch_file['file'].buffered()
+        batch_file['file'].close()
+        self.manifest['files'].append({
+            'stream': key[0],
+            'form_id': key[1],
+            'path': os.path.relpath(batch_file['path'], self.directory),
+            'records': batch_file['records'],
+            'bytes': os.path.getsize(batch_file['path']),
+        })
+        self.manifest_changed = True
+
+    def finish_form(self, form_id):
+        """Finishes the files of a form that has nothing left to write."""
+        for key in [key for key in self.files if key[1] == form_id]:
+            self.close_file(key)
+
+    def close_files(self):
+        for key in list(self.files):
+            self.close_file(key)
+        if not self.manifest_changed:
+            return
+        self.manifest_changed = False
+        self.manifest['streams'].update(self.schemas)
+        # written next to the manifest and moved over it, so it is never
+        # seen half written
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def write_schema(self, stream, schema, key_properties):
+        self.schemas[stream] = {'schema': schema, 'key_properties': key_properties}
+        self.messages.write_schema(stream, schema, key_properties)
+
+    def write_message(self, message):
+        if isinstance(message, singer.StateMessage):
+            self.close_files()
+        self.messages.write_message(message)
+
+    def flush(self):
+        self.messages.flush()
+
+    def close(self):
+        self.close_files()
+        self.messages.close()
@@ -0,0 +1,50 @@
+"""Merges the state files written by the shards of a sharded sync (see the
+shard_index and shard_count config keys) into one.
+
+    tap-typeform merge-state shard0.json shard1.json shard2.json > state.json
+
+Each shard only keeps bookmarks for its own forms, so their bookmarks are
+simply put together. When the same form shows up in more than one file,
+e.g. after shard_count was changed, the bookmark furthest along wins, or
+the one from the last file when they are level.
+"""
+import argparse
+import json
+import sys
+
+
+def merge_states(states):
+    merged = {}
+    bookmarks = {}
+    for state in states:
+        for key, value in state.items():
+            if key != 'bookmarks':
+                merged[key] = value
+        for form_id, bookmark in state.get('bookmarks', {}).items():
+            current = bookmarks.get(form_id)
+            if current is None or \
+                    bookmark.get('date_to_resume', '') >= current.get('date_to_resume', ''):
+                bookmarks[form_id] = bookmark
+    merged['bookmarks'] = bookmarks
+    return merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tap-typeform merge-state',
+                                     description='Merges the state files of a sharded sync.')
+    parser.add_argument('states', nargs='+', metavar='STATE', help='state file of a shard')
+    parser.add_argument('-o', '--output', help='file to write the merged state to, stdout by default')
+    args = parser.parse_args(argv)
+
+    states = []
+    for path in args.states:
+        with open(path) as state_file:
+            states.append(json.load(state_file))
+    merged = merge_states(states)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(merged, output_file, indent=2)
+    else:
+        json.dump(merged, sys.stdout, indent=2)
+        sys.stdout.write('\n')
@@ -0,0 +1,100 @@
+import datetime
+import json
+import sys
+
+import singer
+from singer import utils
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_OUTPUT_BUFFER_SIZE = 64 * 1024
+
+
+class MessageWriter(object):
+    """Writes the tap's Singer messages to stdout.
+
+    RECORD messages are serialised straight into a buffer that is written
+    out in chunks of about `output_buffer_size` characters (0 writes every
+    message as soon as it is serialised). The serialised messages are the
+    same as singer.write_record's. Setting `output_json_library` to orjson
+    serialises records with orjson instead, which is faster but writes
+    compact JSON with non-ascii characters left as they are. Every other
+    message flushes the buffer first, so a STATE message always comes after
+    the records it covers.
+    """
+
+    def __init__(self, config):
+        self.buffer_size = int(config.get('output_buffer_size', DEFAULT_OUTPUT_BUFFER_SIZE))
+        json_library = config.get('output_json_library', 'json')
+        if json_library == 'orjson':
+            if orjson is None:
+                raise Exception('output_json_library is orjson but orjson is not installed')
+            self.dumps = lambda obj: orjson.dumps(obj).decode('utf-8')
+            self.separators = (',', ':')
+        elif json_library == 'json':
+            self.dumps = json.dumps
+            self.separators = (', ', ': ')
+        else:
+            raise Exception('unknown output_json_library {}, use json or orjson'.format(json_library))
+        self.buffer = []
+        self.buffered = 0
+
+    def record_format(self, stream, time_extracted=None):
+        """Returns the text that goes before and after a serialised record of
+        the stream, that way only the record itself is serialised for every
+        message."""
+        item, key = self.separators
+        prefix = '{{"type"{key}"RECORD"{item}"stream"{key}{stream}{item}"record"{key}'.format(
+            item=item, key=key, stream=self.dumps(stream))
+        suffix = '}\n'
+        if time_extracted:
+            suffix = '{item}"time_extracted"{key}{time_extracted}}}\n'.format(
+                item=item, key=key, time_extracted=self.dumps(utils.strftime(time_extracted.astimezone(datetime.timezone.utc))))
+        return prefix, suffix
+
+    def write_record(self, record, record_format):
+        prefix, suffix = record_format
+        line = prefix + self.dumps(record) + suffix
+        self.buffer.append(line)
+        self.buffered += len(line)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def write_serialised(self, text):
+        """Writes messages that have already been serialised, a line each."""
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def write_schema(self, stream, schema, key_properties):
+        self.write_message(singer.SchemaMessage(stream=stream, schema=schema, key_properties=key_properties))
+
+    def finish_form(self, form_id):
+        pass
+
+    def write_message(self, message):
+        self.flush()
+        singer.write_message(message)
+
+    def flush(self):
+        if self.buffer:
+            sys.stdout.write(''.join(self.buffer))
+            sys.stdout.flush()
+            self.buffer = []
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+def get_output(config):
+    """Records go to stdout as RECORD messages, or to files when
+    `output_dir` is set."""
+    if config.get('output_dir'):
+        from tap_typeform.file_output import BatchFileWriter
+        return BatchFileWriter(config)
+    return MessageWriter(config)
@@ -1,3 +1,5 @@
+import copy
+import functools
 import os
 import re
 
@@ -47,11 +49,18 @@ def normalize_fieldname(fieldname):
 def get_abs_path(path):
     return os.path.join(os.path.dirname(os.path.realpath(__file__)), path)
 
-def load_schema(tap_stream_id):
+@functools.lru_cache(maxsize=None)
+def _load_schema(tap_stream_id):
     path = 'schema/{}.json'.format(tap_stream_id)
     #print("schema path=",path)
     return utils.load_json(get_abs_path(path))
 
+
+def load_schema(tap_stream_id):
+    # each file is only read and parsed once per process, callers get their
+    # own copy since the singer transformer reorders schema types in place
+    return copy.deepcopy(_load_schema(tap_stream_id))
+
 def load_and_write_schema(tap_stream_id):
     schema = load_schema(tap_stream_id)
     singer.write_schema(tap_stream_id, schema, PK_FIELDS[tap_stream_id])
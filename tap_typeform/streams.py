@@ -1,42 +1,166 @@
+import collections
 import time
 import datetime
+import functools
+import hashlib
 import json
-import pytz
+import re
+import queue
+import sys
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
-import pendulum
 import singer
 from singer.bookmarks import write_bookmark, reset_stream
-from ratelimit import limits, sleep_and_retry, RateLimitException
-from backoff import on_exception, expo, constant
+from singer.transform import string_to_datetime
+from backoff import on_exception, constant
 from tap_typeform import schemas
-from tap_typeform.client import MetricsRateLimitException
+from tap_typeform.client import MetricsRateLimitException, ServerErrorException
 
 LOGGER = singer.get_logger()
 
-MAX_METRIC_JOB_TIME = 1800
-RESPONSE_PAGE_SIZE = 800
-METRIC_JOB_POLL_SLEEP = 1
-FORM_STREAMS = ['landings', 'answers']  # streams that get sync'd in sync_forms
+# the largest page of responses the api hands out
+MAX_RESPONSE_PAGE_SIZE = 1000
+# pages are never shrunk below this after timeouts and server errors
+MIN_RESPONSE_PAGE_SIZE = 25
+# number of pages fetched before a shrunk page size is doubled again
+RECOVERY_PAGES = 5
+# responses of a streamed page whose records are handed on together
+STREAM_CHUNK_SIZE = 100
+FORMS_PAGE_SIZE = 200
+# the endpoint each stream's records are built from. a form's definition and
+# responses are only requested when a selected stream is built from them, and
+# streams sharing an endpoint share every request made to it
+STREAM_ENDPOINTS = collections.OrderedDict([
+    ('forms', 'forms'),
+    ('questions', 'definition'),
+    ('landings', 'responses'),
+    ('answers', 'responses'),
+])
+FORM_STREAMS = [stream_id for stream_id, endpoint in STREAM_ENDPOINTS.items()
+                if endpoint == 'responses']  # streams that get sync'd in sync_forms
 
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
+# records built from one api call for a form, along with the bookmark keys to
+# save once they have been written (None for pages that don't move them)
+FormPage = collections.namedtuple('FormPage', ['form_id', 'records', 'bookmark'])
+# more jobs for the workers, handed from a form's job to the main thread
+FormJobs = collections.namedtuple('FormJobs', ['form_id', 'jobs'])
 
-def count(tap_stream_id, records):
-    with singer.metrics.record_counter(tap_stream_id) as counter:
-        counter.increment(len(records))
 
+class LazyRecords(object):
+    """The records `build(*args)` generates, only built once they are
+    iterated over. Unlike a generator it can be pickled, so pages can be
+    handed to transform processes. It can only be iterated once, the
+    arguments are let go of so the page data is freed with the generator."""
 
-def write_records(atx, tap_stream_id, records):
-    extraction_time = singer.utils.now()
-    catalog_entry = atx.get_catalog_entry(tap_stream_id)
+    def __init__(self, build, *args):
+        self.build = build
+        self.args = args
+
+    def __iter__(self):
+        build, args = self.build, self.args
+        self.args = None
+        return build(*args)
+
+
+class StreamWriter(object):
+    """Everything needed to write records for one stream, built once per sync
+    instead of for every page: the transform worked out from the schema and
+    metadata, and whether the SCHEMA message has been written yet."""
+
+    def __init__(self, atx, tap_stream_id):
+        self.atx = atx
+        self.tap_stream_id = tap_stream_id
+        catalog_entry = atx.get_catalog_entry(tap_stream_id)
+        self.transformer = singer.Transformer()
+        self.transform = get_record_transform(catalog_entry, self.transformer)
+        self.schema_written = False
+
+    def write_schema(self):
+        if not self.schema_written:
+            self.atx.output.write_schema(self.tap_stream_id, schemas.load_schema(self.tap_stream_id),
+                                         schemas.PK_FIELDS[self.tap_stream_id])
+            self.schema_written = True
+
+    def write_records(self, records):
+        """Transforms and writes records one at a time as they are produced,
+        so records can be any iterable, including a generator."""
+        self.write_schema()
+        output = self.atx.output
+        record_format = output.record_format(self.tap_stream_id, singer.utils.now())
+        build = transform = write = 0.0
+        written = 0
+        records = iter(records)
+        perf_counter = time.perf_counter
+        with singer.metrics.record_counter(self.tap_stream_id) as counter:
+            while True:
+                # records are usually built lazily, pulling the next one is
+                # where that time goes
+                started = perf_counter()
+                rec = next(records, None)
+                built = perf_counter()
+                build += built - started
+                if rec is None:
+                    break
+                rec = self.transform(rec)
+                transformed = perf_counter()
+                output.write_record(rec, record_format)
+                write += perf_counter() - transformed
+                transform += transformed - built
+                counter.increment()
+                written += 1
+        self.atx.counts[self.tap_stream_id] += written
+        timer = self.atx.timer
+        timer.add('build', build, written)
+        timer.add('transform', transform, written)
+        timer.add('write', write, written)
+
+    def write_serialised(self, text, count, filtered=(), removed=()):
+        """Writes `count` RECORD messages that have already been transformed
+        and serialised elsewhere, along with the fields their transformer
+        left out."""
+        self.write_schema()
+        started = time.perf_counter()
+        self.atx.output.write_serialised(text)
+        # the records were counted where they were serialised
+        self.atx.timer.add('write', time.perf_counter() - started, 0)
+        with singer.metrics.record_counter(self.tap_stream_id) as counter:
+            counter.increment(count)
+        self.atx.counts[self.tap_stream_id] += count
+        self.transformer.filtered.update(filtered)
+        self.transformer.removed.update(removed)
+
+    def close(self):
+        self.transformer.log_warning()
+
+
+def get_record_transform(catalog_entry, transformer):
+    """Returns the function records of the stream are transformed with,
+    the fast FlatRecordTransformer when the schema allows it."""
     stream_metadata = singer.metadata.to_map(catalog_entry.metadata)
-    stream_schema = catalog_entry.schema.to_dict()
-    with singer.Transformer() as transformer:
-        for rec in records:
-            rec = transformer.transform(rec, stream_schema, stream_metadata)
-            singer.write_record(tap_stream_id, rec, time_extracted=extraction_time)
-        atx.counts[tap_stream_id] += len(records)
-    count(tap_stream_id, records)
+    if FlatRecordTransformer.supports(catalog_entry):
+        return FlatRecordTransformer(catalog_entry, stream_metadata, transformer).transform
+    return functools.partial(transformer.transform, schema=catalog_entry.schema.to_dict(),
+                             metadata=stream_metadata)
+
+
+def get_stream_writer(atx, tap_stream_id):
+    if tap_stream_id not in atx.stream_writers:
+        atx.stream_writers[tap_stream_id] = StreamWriter(atx, tap_stream_id)
+    return atx.stream_writers[tap_stream_id]
+
+
+def close_stream_writers(atx):
+    for writer in atx.stream_writers.values():
+        writer.close()
+    atx.stream_writers = {}
+
+
+def write_records(atx, tap_stream_id, records):
+    get_stream_writer(atx, tap_stream_id).write_records(records)
 
 
 def get_date_and_integer_fields(stream):
@@ -60,266 +184,1046 @@ def base_transform(date_fields, integer_fields, obj):
         elif field in integer_fields and value is not None:
             value = int(value)
         elif field in date_fields and value is not None:
+            import pendulum
             value = pendulum.parse(value).isoformat()
         new_obj[field] = value
     return new_obj
 
 
 def select_fields(mdata, obj):
+    # these are the rules singer.Transformer uses to filter by metadata,
+    # fields without any selection metadata are kept
     new_obj = {}
     for key, value in obj.items():
-        field_metadata = mdata.get(('properties', key))
-        if field_metadata and \
-                (field_metadata.get('selected') is True or \
-                 field_metadata.get('inclusion') == 'automatic'):
-            new_obj[key] = value
+        field_metadata = mdata.get(('properties', key), {})
+        if field_metadata.get('inclusion') != 'automatic' and \
+                (field_metadata.get('selected') is False or \
+                 field_metadata.get('inclusion') == 'unsupported'):
+            continue
+        new_obj[key] = value
     return new_obj
 
 
+class FallbackToTransformer(Exception):
+    pass
+
+
+def _to_string(value):
+    if value is None or value.__class__ is str:
+        return value
+    return str(value)
+
+
+def _to_integer(value):
+    try:
+        if isinstance(value, str):
+            return int(value.replace(",", ""))
+        return int(value)
+    except (TypeError, ValueError):
+        if value is None or value == "":
+            return None
+        raise FallbackToTransformer()
+
+
+# typeform sends its timestamps as e.g. 2018-01-01T00:00:00Z which singer
+# formats as 2018-01-01T00:00:00.000000Z, anything else goes through singer
+SIMPLE_DATETIME_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z\Z')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_datetime(value):
+    match = SIMPLE_DATETIME_RE.match(value)
+    if match:
+        try:
+            datetime.datetime(*map(int, match.groups()))
+            return value[:19] + '.000000Z'
+        except ValueError:
+            pass
+    return string_to_datetime(value)
+
+
+def _to_datetime(value):
+    if value is None or value == "":
+        return None
+    if value.__class__ is not str:
+        raise FallbackToTransformer()
+    value = _parse_datetime(value)
+    if value is None:
+        raise FallbackToTransformer()
+    return value
+
+
+class FlatRecordTransformer(object):
+    """Transforms records of a stream whose schema is a flat object of
+    nullable strings, integers and date-times, producing exactly what
+    singer.Transformer would. The field list and a converter per field are
+    worked out once from the catalog entry, so each record is a single pass
+    over its keys. Anything unexpected is handed to the generic transformer,
+    which also keeps the filtered/removed paths for its end of sync log."""
+
+    SIMPLE_TYPES = {'null', 'string', 'integer'}
+
+    def __init__(self, catalog_entry, stream_metadata, transformer):
+        self.stream_schema = catalog_entry.schema.to_dict()
+        self.stream_metadata = stream_metadata
+        self.transformer = transformer
+        properties = self.stream_schema['properties']
+        date_fields, integer_fields = get_date_and_integer_fields(catalog_entry)
+        self.converters = {}
+        for field in select_fields(stream_metadata, properties):
+            if field in integer_fields:
+                self.converters[field] = _to_integer
+            elif field in date_fields:
+                self.converters[field] = _to_datetime
+            else:
+                self.converters[field] = _to_string
+        self.unselected = set(properties) - set(self.converters)
+
+    @classmethod
+    def supports(cls, catalog_entry):
+        schema = catalog_entry.schema.to_dict()
+        if set(schema.get('type', [])) != {'null', 'object'} or 'properties' not in schema:
+            return False
+        for json_schema in schema['properties'].values():
+            _type = json_schema.get('type')
+            types = set(_type) if isinstance(_type, list) else {_type}
+            if set(json_schema) - {'type', 'format'} or not types <= cls.SIMPLE_TYPES:
+                return False
+            # the generic transformer's result depends on the order of the
+            # types when a field can be both, leave those to it
+            if len(types & {'string', 'integer'}) != 1:
+                return False
+            if 'format' in json_schema and \
+                    (json_schema['format'] != 'date-time' or 'integer' in types):
+                return False
+        return True
+
+    def transform(self, rec):
+        new_rec = {}
+        try:
+            for key, value in rec.items():
+                convert = self.converters.get(key)
+                if convert is None:
+                    if key in self.unselected:
+                        self.transformer.filtered.add(key)
+                    else:
+                        self.transformer.removed.add(key)
+                    continue
+                new_rec[key] = convert(value)
+        except FallbackToTransformer:
+            return self.transformer.transform(rec, self.stream_schema, self.stream_metadata)
+        return new_rec
+
+
 @on_exception(constant, MetricsRateLimitException, max_tries=5, interval=60)
-@on_exception(expo, RateLimitException, max_tries=5)
-@sleep_and_retry
-@limits(calls=1, period=6)  # 5 seconds needed to be padded by 1 second to work
-def get_form_definition(atx, form_id):
-    return atx.client.get(form_id)
+def get_form_definition(atx, form_id, last_updated_at=None):
+    return atx.client.get(form_id, last_updated_at=last_updated_at)
 
 
 @on_exception(constant, MetricsRateLimitException, max_tries=5, interval=60)
-@on_exception(expo, RateLimitException, max_tries=5)
-@sleep_and_retry
-@limits(calls=1, period=6)  # 5 seconds needed to be padded by 1 second to work
-def get_form(atx, form_id, start_date, end_date, token_value_last_response):
-    LOGGER.info('Forms query - form: {} start_date: {} end_date: {} '.format(
+def get_form(atx, form_id, start_date, end_date, token_value_last_response, page_size, stream_items=False):
+    LOGGER.info('Forms query - form: {} start_date: {} end_date: {} page_size: {}'.format(
         form_id,
         start_date,
-        end_date))
-    # the api limits responses to a max of 1000 per call
-    # the api doesn't have a means of paging through responses if the number is greater than 1000,
+        end_date,
+        page_size))
+    # the api doesn't have a means of paging through responses by page number,
     # so since the order of data retrieved is by submitted_at we have
     # to take the last submitted_at date and use it to cycle through
 
     if token_value_last_response is None:
-        return atx.client.get(form_id, params={'since': start_date, 'until': end_date, 'page_size': RESPONSE_PAGE_SIZE,
-                                               'sort': 'submitted_at,asc'})
+        return atx.client.get(form_id, params={'since': start_date, 'until': end_date, 'page_size': page_size,
+                                               'sort': 'submitted_at,asc'}, stream_items=stream_items)
     else:
-        return atx.client.get(form_id, params={'since': start_date, 'until': end_date, 'page_size': RESPONSE_PAGE_SIZE,
-                                               'after': token_value_last_response})
+        return atx.client.get(form_id, params={'since': start_date, 'until': end_date, 'page_size': page_size,
+                                               'after': token_value_last_response}, stream_items=stream_items)
+
+
+class ResponsePageSize(object):
+    """The number of responses asked for per request while paging through a
+    form. It starts at `response_page_size` (the api maximum by default),
+    is halved whenever a page times out or fails with a server error and is
+    doubled again after every RECOVERY_PAGES pages that come back fine."""
+
+    def __init__(self, config):
+        self.maximum = min(int(config.get('response_page_size', MAX_RESPONSE_PAGE_SIZE)), MAX_RESPONSE_PAGE_SIZE)
+        self.size = self.maximum
+        self.successes = 0
+
+    def shrink(self):
+        """Returns False when the page size can't get any smaller."""
+        if self.size <= MIN_RESPONSE_PAGE_SIZE:
+            return False
+        self.size = max(self.size // 2, MIN_RESPONSE_PAGE_SIZE)
+        self.successes = 0
+        return True
 
+    def success(self):
+        if self.size < self.maximum:
+            self.successes += 1
+            if self.successes >= RECOVERY_PAGES:
+                self.size = min(self.size * 2, self.maximum)
+                self.successes = 0
 
-def sync_form_definition(atx, form_id):
+
+def sync_form_definition(atx, form_id, last_updated_at=None):
     with singer.metrics.job_timer('form definition ' + form_id):
-        start = time.monotonic()
-        while True:
-            if (time.monotonic() - start) >= MAX_METRIC_JOB_TIME:
-                raise Exception('Metric job timeout ({} secs)'.format(
-                    MAX_METRIC_JOB_TIME))
-            response = get_form_definition(atx, form_id)
-            data = response.get('fields', [])
-            if data != '':
-                break
-            else:
-                time.sleep(METRIC_JOB_POLL_SLEEP)
+        return get_form_definition(atx, form_id, last_updated_at)
+
+
+def get_definition_fingerprint(fields):
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def definition_changed(atx, form):
+    """Form definitions are only downloaded again once the form's
+    last_updated_at in the forms listing has moved on from the one stored
+    when its questions were last synced."""
+    last_updated_at = form.get('last_updated_at')
+    if last_updated_at is None:
+        return True
+    bookmark = atx.state.get('bookmarks', {}).get(form["id"], {})
+    return bookmark.get('definition_last_updated_at') != last_updated_at
+
+
+def get_questions_page(atx, form):
+    form_id = form["id"]
+    # a cached definition is as good as a new one while the form hasn't
+    # been updated since
+    response = sync_form_definition(atx, form_id, form.get('last_updated_at'))
+    fields = response.get('fields', [])
+    fingerprint = get_definition_fingerprint(fields)
+    bookmark = atx.state.get('bookmarks', {}).get(form_id, {})
+
+    records = {}
+    if bookmark.get('definition_fingerprint') != fingerprint:
+        records['questions'] = LazyRecords(iter_question_records, form_id, fields)
+    else:
+        LOGGER.info('form: {} questions unchanged'.format(form_id))
 
-    definition_data_rows = []
+    return FormPage(form_id, records, {
+        'definition_last_updated_at': form.get('last_updated_at', response.get('last_updated_at')),
+        'definition_fingerprint': fingerprint
+    })
 
+
+def iter_question_records(form_id, fields):
     # we only care about a few fields in the form definition
     # just those that give an analyst a reference to the submissions
-    for row in data:
-        definition_data_rows.append({
+    for row in fields:
+        yield {
             "form_id": form_id,
             "question_id": row['id'],
             "title": row['title'],
             "ref": row['ref'],
             "parent_question_id": ''
-        })
+        }
 
         # treat subquestions if is a question group
         child_questions = row.get('properties', {}).get('fields', [])
 
         for child_question in child_questions:
-            definition_data_rows.append({
+            yield {
                 "form_id": form_id,
                 "question_id": child_question['id'],
                 "title": child_question['title'],
                 "ref": child_question['ref'],
                 "parent_question_id": row['id']
-            })
-
-    write_records(atx, 'questions', definition_data_rows)
+            }
 
 
-def sync_form_data(atx, form_id, start_date, end_date, token_value_last_response, stream_id):
+def sync_form_data(atx, form_id, start_date, end_date, token_value_last_response, stream_ids, page_size):
     with singer.metrics.job_timer('form ' + form_id):
-        start = time.monotonic()
-        # we've really moved this functionality to the request in the http script
-        # so we don't expect that this will actually have to run mult times
         while True:
-            if (time.monotonic() - start) >= MAX_METRIC_JOB_TIME:
-                raise Exception('Metric job timeout ({} secs)'.format(
-                    MAX_METRIC_JOB_TIME))
-            response = get_form(atx, form_id, start_date, end_date, token_value_last_response)
-            data = response['items']
-            if data != '':
-                break
-            else:
-                time.sleep(METRIC_JOB_POLL_SLEEP)
-
-    landings_data_rows = []
-    answers_data_rows = []
+            requested = page_size.size
+            try:
+                response = get_form(atx, form_id, start_date, end_date, token_value_last_response, requested)
+                data = response['items']
+                last_response = data[-1] if data else None
+                # both streams are built from the same page of responses,
+                # so each page is only ever downloaded once no matter how
+                # many of them are being synced. records are generated
+                # lazily, none of them are held in memory until the
+                # writer asks for them
+                records = get_response_records(form_id, data, stream_ids)
+                # paging stops on the first page that isn't full, or
+                # sooner if the api says there is nothing after it
+                total_items = response.get('total_items')
+                is_last_page = len(data) < requested or (total_items is not None and total_items <= len(data))
+            except ServerErrorException:
+                # heavy forms can be too slow to serve a full page, ask again
+                # for a smaller one
+                if not page_size.shrink():
+                    raise
+                LOGGER.warning('form: {} page of {} responses failed, retrying with {}'.format(
+                    form_id, requested, page_size.size))
+                continue
+            page_size.success()
+            break
 
     max_submitted_dt = start_date
+    if last_response is not None:
+        max_submitted_dt = last_response['submitted_at']
+        token_value_last_response = last_response['token']
+
+    return [is_last_page, max_submitted_dt, token_value_last_response, records, total_items]
+
+
+def get_response_records(form_id, data, stream_ids):
+    return {stream_id: LazyRecords(RESPONSE_RECORD_BUILDERS[stream_id], form_id, data)
+            for stream_id in get_endpoint_stream_ids(stream_ids, 'responses')}
+
+
+def iter_streamed_responses(atx, form_id, start_date, end_date, token_value_last_response, stream_ids):
+    """iter_responses with `stream_responses` on. Each page is parsed one
+    response at a time while it downloads, and the records of every
+    STREAM_CHUNK_SIZE responses are yielded as soon as they have been
+    parsed. The writer gets to them while the rest of the page is still
+    coming in, and only a chunk of the page is ever held in memory. Only
+    the last chunk of a page moves the bookmark.
 
+    A page that fails half way is asked for again with a smaller page size
+    from the last response yielded, so nothing is written twice."""
+    page_size = ResponsePageSize(atx.config)
+    perf_counter = time.perf_counter
+    last_response = None
+    while True:
+        requested = page_size.size
+        count = 0
+        chunk = []
+        try:
+            with singer.metrics.job_timer('form ' + form_id):
+                items = get_form(atx, form_id, start_date, end_date, token_value_last_response, requested,
+                                 stream_items=True)
+            while True:
+                # the body downloads as it is parsed, so this times both
+                started = perf_counter()
+                item = next(items, None)
+                atx.timer.add('json_decode', perf_counter() - started)
+                if item is None:
+                    break
+                count += 1
+                chunk.append(item)
+                if len(chunk) == STREAM_CHUNK_SIZE:
+                    last_response = chunk[-1]
+                    start_date = last_response['submitted_at']
+                    token_value_last_response = last_response['token']
+                    yield [get_response_records(form_id, chunk, stream_ids), start_date,
+                           token_value_last_response, False, False, None]
+                    chunk = []
+        except ServerErrorException:
+            if not page_size.shrink():
+                raise
+            LOGGER.warning('form: {} page of {} responses failed after {}, retrying with {}'.format(
+                form_id, requested, count, page_size.size))
+            continue
+        page_size.success()
+
+        if chunk:
+            last_response = chunk[-1]
+            start_date = last_response['submitted_at']
+            token_value_last_response = last_response['token']
+        is_last_page = count < requested
+        # the total isn't parsed out of a streamed body
+        yield [get_response_records(form_id, chunk, stream_ids), start_date,
+               token_value_last_response, is_last_page, True, None]
+        if is_last_page:
+            break
+
+
+def iter_landing_records(form_id, data):
     for row in data:
         if 'hidden' not in row:
             hidden = ''
         else:
             hidden = json.dumps(row['hidden'])
 
-        max_submitted_dt = row['submitted_at']
-        token_value_last_response = row['token']
+        # the schema here reflects what we saw through testing
+        # the typeform documentation is subtly inaccurate
+        yield {
+            "landing_id": row['landing_id'],
+            "token": row['token'],
+            "form_id": form_id,
+            "landed_at": row['landed_at'],
+            "submitted_at": row['submitted_at'],
+            "user_agent": row['metadata']['user_agent'],
+            "platform": row['metadata']['platform'],
+            "referer": row['metadata']['referer'],
+            "network_id": row['metadata']['network_id'],
+            "browser": row['metadata']['browser'],
+            "hidden": hidden
+        }
+
+
+# how the answer of each answer type is turned into the answers stream's
+# string `answer` field, types that aren't listed are used as they are
+ANSWER_CONVERTERS = {
+    'choice': json.dumps,
+    'choices': json.dumps,
+    'payment': json.dumps,
+    'number': str,
+    'boolean': str,
+}
 
-        if stream_id == 'landings':
-            # the schema here reflects what we saw through testing
-            # the typeform documentation is subtly inaccurate
-            landings_data_rows.append({
-                "landing_id": row['landing_id'],
-                "token": row['token'],
+
+def iter_answer_records(form_id, data):
+    converters = ANSWER_CONVERTERS
+    for row in data:
+        answers = row['answers']
+        if answers is None:
+            continue
+        # the same for every answer of the response
+        landing_id = row.get('landing_id')
+        submitted_at = row.get('submitted_at')
+        for answer in answers:
+            data_type = answer.get('type')
+            field = answer.get('field', {})
+            answer_value = answer.get(data_type)
+            convert = converters.get(data_type)
+            if convert is not None:
+                answer_value = convert(answer_value)
+
+            yield {
+                "landing_id": landing_id,
+                "question_id": field.get('id'),
+                "type": field.get('type'),
                 "form_id": form_id,
-                "landed_at": row['landed_at'],
-                "submitted_at": row['submitted_at'],
-                "user_agent": row['metadata']['user_agent'],
-                "platform": row['metadata']['platform'],
-                "referer": row['metadata']['referer'],
-                "network_id": row['metadata']['network_id'],
-                "browser": row['metadata']['browser'],
-                "hidden": hidden
-            })
-
-        if stream_id == 'answers':
-            if row['answers'] is not None:
-                for answer in row['answers']:
-                    data_type = answer.get('type')
-
-                    if data_type in ['choice', 'choices', 'payment']:
-                        answer_value = json.dumps(answer.get(data_type))
-                    elif data_type in ['number', 'boolean']:
-                        answer_value = str(answer.get(data_type))
-                    else:
-                        answer_value = answer.get(data_type)
+                "ref": field.get('ref'),
+                "data_type": data_type,
+                "answer": answer_value,
+                "submitted_at": submitted_at
+            }
+
+
+# builds the records of each responses stream from a page of responses
+RESPONSE_RECORD_BUILDERS = {
+    'landings': iter_landing_records,
+    'answers': iter_answer_records,
+}
+
+
+def write_forms_state(atx, form_id, bookmark):
+    # a None value clears the key, e.g. the token of a finished shard window
+    for key, value in bookmark.items():
+        if value is not None:
+            write_bookmark(atx.state, form_id, key, value)
+        else:
+            atx.state.get('bookmarks', {}).get(form_id, {}).pop(key, None)
+    atx.checkpoint()
+
+
+def get_responses_fingerprint(form):
+    """A closed form (settings.is_public false) can't receive responses, and
+    opening it again changes its last_updated_at. So once a closed form has
+    been fully synced, its last_updated_at tells us whether anything can
+    have changed since. Open forms have no fingerprint."""
+    if form.get('settings', {}).get('is_public', True) is not False:
+        return None
+    return form.get('last_updated_at')
+
+
+def has_new_responses(atx, form):
+    fingerprint = get_responses_fingerprint(form)
+    if fingerprint is None:
+        return True
+    bookmark = atx.state.get('bookmarks', {}).get(form["id"], {})
+    return bookmark.get('responses_fingerprint') != fingerprint
+
+
+def get_pinned_form_ids(atx):
+    """The `forms` config key, a comma separated list of form ids to sync."""
+    pinned = atx.config.get('forms') or []
+    if isinstance(pinned, str):
+        pinned = pinned.split(',')
+    return [form_id.strip() for form_id in pinned if form_id.strip()]
 
-                    answers_data_rows.append({
-                        "landing_id": row.get('landing_id'),
-                        "question_id": answer.get('field', {}).get('id'),
-                        "type": answer.get('field', {}).get('type'),
-                        "form_id": form_id,
-                        "ref": answer.get('field', {}).get('ref'),
-                        "data_type": data_type,
-                        "answer": answer_value,
-                        "submitted_at": row.get('submitted_at')
-                    })
 
+def get_shard(atx):
+    """The `shard_index` and `shard_count` config keys, which split the
+    workspace's forms between several tap processes."""
+    shard_count = int(atx.config.get('shard_count', 1))
+    shard_index = int(atx.config.get('shard_index', 0))
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise Exception('shard_index must be between 0 and shard_count - 1, got {} of {}'.format(
+            shard_index, shard_count))
+    return shard_index, shard_count
 
-    if stream_id == 'landings':
-        schemas.load_and_write_schema('landings')
-        write_records(atx, "landings", landings_data_rows)
 
-    if stream_id == 'answers':
-        schemas.load_and_write_schema('answers')
-        write_records(atx, "answers", answers_data_rows)
+def get_form_shard(form_id, shard_count):
+    # crc32 gives every process the same answer, unlike the salted hash()
+    return zlib.crc32(form_id.encode('utf-8')) % shard_count
 
-    return [response['total_items'], max_submitted_dt, token_value_last_response]
 
+def in_shard(atx, form_id):
+    shard_index, shard_count = get_shard(atx)
+    return get_form_shard(form_id, shard_count) == shard_index
 
-def write_forms_state(atx, form_id, date_to_resume, token_value_last_response):
-    # write_bookmark(atx.state, form, 'date_to_resume', date_to_resume.to_datetime_string())
-    write_bookmark(atx.state, form_id, 'date_to_resume', date_to_resume)
-    if token_value_last_response is not None:
-        write_bookmark(atx.state, form_id, 'last_synchronised_response_token', token_value_last_response)
-    atx.write_state()
 
+def drop_other_shards_bookmarks(atx):
+    """Leaves only this shard's forms in the state, so that each shard's
+    state files only ever hold the bookmarks it is responsible for."""
+    bookmarks = atx.state.get('bookmarks', {})
+    for form_id in [form_id for form_id in bookmarks if not in_shard(atx, form_id)]:
+        del bookmarks[form_id]
 
-def getForms(atx, callback, **kwargs):
-    if 'page' not in kwargs:
-        kwargs['page'] = 1
-        kwargs['page_size'] = 200
-    type_forms = atx.client.get('forms', params=kwargs)['items']
-    callback(atx, type_forms)
-    if len(type_forms) == kwargs['page_size']:
-        kwargs['page'] += 1
-        getForms(atx, callback, **kwargs)
+
+def getForms(atx, list_forms=True):
+    """Returns the forms to sync, indexed by id. This is only called once per
+    sync, every stream works off the same index. When specific forms are
+    pinned in the config and the forms stream isn't selected there is no
+    need to list them at all."""
+    pinned_form_ids = get_pinned_form_ids(atx)
+    # pinned forms that belong to other shards are left to them
+    pinned = [form_id for form_id in pinned_form_ids if in_shard(atx, form_id)]
+    if pinned_form_ids and not list_forms:
+        return collections.OrderedDict((form_id, {"id": form_id}) for form_id in pinned)
+
+    forms = collections.OrderedDict()
+    page = 1
+    while True:
+        type_forms = atx.client.get('forms', params={'page': page, 'page_size': FORMS_PAGE_SIZE})['items']
+        for form in type_forms:
+            forms[form["id"]] = form
+        if len(type_forms) < FORMS_PAGE_SIZE:
+            break
+        page += 1
+
+    if pinned_form_ids:
+        missing = [form_id for form_id in pinned if form_id not in forms]
+        if missing:
+            LOGGER.warning('forms not found in the workspace: {}'.format(', '.join(missing)))
+        forms = collections.OrderedDict((form_id, forms[form_id]) for form_id in pinned if form_id in forms)
+    else:
+        forms = collections.OrderedDict((form_id, form) for form_id, form in forms.items() if in_shard(atx, form_id))
+
+    shard_index, shard_count = get_shard(atx)
+    if shard_count > 1:
+        LOGGER.info('shard {} of {}: {} forms'.format(shard_index, shard_count, len(forms)))
+    return forms
 
 
 def syncTypeForms(atx, typeForms):
-    schemas.load_and_write_schema('forms')
     write_records(atx, "forms", typeForms)
 
 
+def get_selected_stream_ids(atx):
+    return [stream.tap_stream_id for stream in atx.catalog.streams
+            if stream.tap_stream_id in atx.selected_stream_ids
+            and stream.tap_stream_id in STREAM_ENDPOINTS]
+
+
+def get_endpoint_stream_ids(stream_ids, endpoint):
+    """The streams among stream_ids that are built from the endpoint, an
+    empty list means nothing needs to be requested from it."""
+    return [stream_id for stream_id in stream_ids if STREAM_ENDPOINTS[stream_id] == endpoint]
+
+
+def get_form_stream_ids(stream_ids):
+    """The streams among stream_ids that are synced form by form."""
+    return [stream_id for stream_id in stream_ids if STREAM_ENDPOINTS[stream_id] != 'forms']
+
+
 def sync(atx):
-    for stream in atx.catalog.streams:
-        if stream.tap_stream_id == "forms":
-            getForms(atx, syncTypeForms)
+    stream_ids = get_selected_stream_ids(atx)
+    if not stream_ids:
+        LOGGER.info('no streams selected')
+        return
+    drop_other_shards_bookmarks(atx)
+    try:
+        list_forms = bool(get_endpoint_stream_ids(stream_ids, 'forms'))
+        forms = getForms(atx, list_forms=list_forms)
+        if list_forms:
+            syncTypeForms(atx, list(forms.values()))
+        form_stream_ids = get_form_stream_ids(stream_ids)
+        if form_stream_ids:
+            get_forms_data(atx, list(forms.values()), form_stream_ids)
+    finally:
+        # bookmarks only ever cover records that were written, so whatever
+        # is in memory is safe to write out even when the sync failed
+        atx.flush_state()
+        close_stream_writers(atx)
+        atx.output.close()
+
+
+def plan(atx):
+    """Counts what a sync would fetch without fetching any of it, and writes
+    the plan to stdout as json: the forms in the order they'd be synced,
+    their pending responses, an estimate of the requests each will take
+    and how long those take at the configured request rate."""
+    stream_ids = get_selected_stream_ids(atx)
+    drop_other_shards_bookmarks(atx)
+    list_forms = bool(get_endpoint_stream_ids(stream_ids, 'forms'))
+    forms = getForms(atx, list_forms=list_forms)
+    form_stream_ids = get_form_stream_ids(stream_ids)
+    plans = plan_forms(atx, list(forms.values()), form_stream_ids, count_responses=True)
+    plans.sort(key=lambda plan: plan.pending_responses or 0, reverse=True)
+
+    planned_forms = [{
+        'form_id': plan.form["id"],
+        'streams': plan.stream_ids,
+        'pending_responses': plan.pending_responses,
+        'requests': estimate_requests(atx, plan),
+    } for plan in plans]
+    requests = sum(planned_form['requests'] for planned_form in planned_forms)
+    if list_forms:
+        requests += -(-len(forms) // FORMS_PAGE_SIZE)
+    rate = atx.client.rate_limiter.max_rate
+    summary = {
+        'forms': planned_forms,
+        'pending_responses': sum(planned_form['pending_responses'] or 0 for planned_form in planned_forms),
+        'requests': requests,
+        'estimated_seconds': round(requests / rate, 1),
+    }
+
+    LOGGER.info('%-30s %12s %10s', 'form', 'responses', 'requests')
+    for planned_form in planned_forms:
+        LOGGER.info('%-30s %12s %10d', planned_form['form_id'],
+                    '-' if planned_form['pending_responses'] is None else planned_form['pending_responses'],
+                    planned_form['requests'])
+    LOGGER.info('{} forms, {} pending responses, {} requests, at least {:.0f}s at {:g} requests/s'.format(
+        len(planned_forms), summary['pending_responses'], requests, summary['estimated_seconds'], rate))
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+def get_responses_range(atx, form_id):
+    """Returns the since/until dates and `after` token the form's responses
+    have to be fetched with to pick up where the last sync stopped."""
+    bookmark = atx.state.get('bookmarks', {}).get(form_id, {})
+
+    # start_date is defaulted in the config file 2018-01-01
+    # if there's no default date and it gets set to now, then start_date will have to be
+    #   set to the prior business day/hour before we can use it.
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0).strftime(DATE_FORMAT)
+
+    start_date = datetime.datetime.strptime(atx.config.get('start_date', today), DATE_FORMAT).replace(hour=0,
+                                                                                                      minute=0,
+                                                                                                      second=0,
+                                                                                                      microsecond=0).strftime(
+        DATE_FORMAT)
+
+    end_date = now + datetime.timedelta(days=1)
+    end_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0).strftime(DATE_FORMAT)
+
+
+    # if the state file has a date_to_resume, we use it as it is.
+    # if it doesn't exist, we overwrite by start date
+    last_date = bookmark.get('date_to_resume', start_date)
+    LOGGER.info('last_date: {} '.format(last_date))
+    LOGGER.info('start_date: {} '.format(last_date))
+    LOGGER.info('end_date: {} '.format(end_date))
+
+    token_value_last_response = bookmark.get('last_synchronised_response_token',
+                                             None)  # since it is the first call for the current form_id
+    return last_date, end_date, token_value_last_response
+
+
+def iter_responses(atx, form_id, start_date, end_date, token_value_last_response, stream_ids):
+    """Pages through the form's responses submitted between start_date and
+    end_date, yielding [records, max_submitted_at, token, is_last_page,
+    is_page_end, total_items] for every page. is_page_end is only ever False
+    for the chunks of a page that iter_streamed_responses yields before its
+    end, which don't move the bookmark. total_items is the number of
+    responses the api said were left as of the page, None when unknown."""
+    if atx.client.stream_responses:
+        yield from iter_streamed_responses(atx, form_id, start_date, end_date, token_value_last_response,
+                                           stream_ids)
+        return
+    page_size = ResponsePageSize(atx.config)
+    while True:
+        [is_last_page, max_submitted_at, token_value_last_response, records, total_items] = sync_form_data(atx, form_id,
+                                                                                              start_date,
+                                                                                              end_date,
+                                                                                              token_value_last_response,
+                                                                                              stream_ids,
+                                                                                              page_size)
+        yield [records, max_submitted_at, token_value_last_response, is_last_page, True, total_items]
+        if is_last_page:
+            break
+        # the next page starts from the last response of this one, the
+        # `after` token keeps it from being fetched twice
+        start_date = max_submitted_at
+
+
+def get_form_pages(atx, form, stream_ids, can_shard=False):
+    """Fetches everything the selected streams need for one form and yields
+    it as FormPages, without writing anything. This is what runs on the
+    worker threads when forms are synced concurrently.
+
+    With can_shard, a form with plenty of responses left after its first
+    page may have the rest of them split into windows (see
+    get_response_shards). Their jobs are then yielded as FormJobs for the
+    main thread to hand to the other workers, and this generator stops."""
+    form_id = form["id"]
+    # landings and answers share a single pass over the responses endpoint
+    response_stream_ids = get_endpoint_stream_ids(stream_ids, 'responses')
+
+    LOGGER.info('form: {} '.format(form_id))
+
+    # pull back the form question details
+    if get_endpoint_stream_ids(stream_ids, 'definition'):
+        yield get_questions_page(atx, form)
+
+    if not response_stream_ids:
+        return
+
+    last_date, end_date, token_value_last_response = get_responses_range(atx, form_id)
+
+    for records, max_submitted_at, token_value_last_response, last_page, page_end, total_items in iter_responses(
+            atx, form_id, last_date, end_date, token_value_last_response, response_stream_ids):
+        if not page_end:
+            yield FormPage(form_id, records, None)
+            continue
+        bookmark = {
+            'date_to_resume': max_submitted_at,
+            'last_synchronised_response_token': token_value_last_response
+        }
+        # if the prior sync is successful it will write the date_to_resume bookmark
+        if last_page:
+            bookmark['responses_fingerprint'] = get_responses_fingerprint(form)
+        yield FormPage(form_id, records, bookmark)
+
+        # only ever decided on the first page, forms that fit in one page
+        # never get this far
+        if can_shard and not last_page:
+            can_shard = False
+            shards = get_response_shards(atx, form, response_stream_ids, max_submitted_at, end_date,
+                                         token_value_last_response, total_items)
+            if shards is not None:
+                yield FormJobs(form_id, shards.jobs(atx))
+                return
+
+
+# months don't have a fixed length, see next_window_start
+INCREMENTAL_RANGES = {
+    'hourly': datetime.timedelta(hours=1),
+    'daily': datetime.timedelta(days=1),
+    'weekly': datetime.timedelta(weeks=1),
+    'monthly': None,
+}
+DEFAULT_SHARD_MIN_RESPONSES = 10000
+# windows per worker a form's responses are split into at most. a few more
+# windows than workers evens out busy and quiet stretches of the range
+WINDOWS_PER_WORKER = 4
+
+
+def next_window_start(window_start, incremental_range):
+    if incremental_range == 'monthly':
+        if window_start.month == 12:
+            return window_start.replace(year=window_start.year + 1, month=1)
+        # clamp to the end of shorter months, e.g. jan 31st -> feb 28th
+        for day in range(window_start.day, 27, -1):
+            try:
+                return window_start.replace(month=window_start.month + 1, day=day)
+            except ValueError:
+                continue
+        return window_start.replace(month=window_start.month + 1)
+    return window_start + INCREMENTAL_RANGES[incremental_range]
+
+
+def split_range(start_date, end_date, incremental_range):
+    """Splits [start_date, end_date) into consecutive windows of the size
+    given by the `incremental_range` config key, as (start, end) pairs where
+    each window's end is the next one's start."""
+    windows = []
+    window_start = singer.utils.strptime_to_utc(start_date)
+    end = singer.utils.strptime_to_utc(end_date)
+    while window_start < end:
+        window_end = min(next_window_start(window_start, incremental_range), end)
+        windows.append((window_start.strftime(DATE_FORMAT), window_end.strftime(DATE_FORMAT)))
+        window_start = window_end
+    return windows
+
+
+def merge_windows(windows, max_windows):
+    """Joins runs of adjacent windows so that there are at most max_windows
+    of them. Every window costs a request even when it is empty, so there is
+    no point in having many more of them than pages of responses."""
+    size = -(-len(windows) // max(1, max_windows))
+    return [(windows[start][0], windows[min(start + size, len(windows)) - 1][1])
+            for start in range(0, len(windows), size)]
+
+
+def get_window_until(window_end):
+    """since and until are both inclusive, so a window stops a second
+    before the next one starts and a response submitted on the boundary is
+    only fetched once."""
+    return (singer.utils.strptime_to_utc(window_end) - datetime.timedelta(seconds=1)).strftime(DATE_FORMAT)
+
+
+@on_exception(constant, MetricsRateLimitException, max_tries=5, interval=60)
+def get_response_count(atx, form_id, start_date, end_date):
+    return atx.client.get(form_id, params={'since': start_date, 'until': end_date, 'page_size': 1})['total_items']
+
+
+def get_response_shards(atx, form, stream_ids, start_date, end_date, token_value_last_response, pending):
+    """Returns ResponseShards for a form's responses from start_date on when
+    they are worth splitting over several workers, or None to carry on
+    paging through them. This runs on the form's worker once its first page
+    is in, pending is the total_items of that page. For a streamed page the
+    api's total isn't known and is counted with a page_size=1 request,
+    only ever made for forms whose range spans more than two windows and
+    whose responses don't fit in one page. Adjacent windows are merged
+    until there are no more than the pages of pending responses, and no
+    more than WINDOWS_PER_WORKER per worker."""
+    incremental_range = atx.config.get('incremental_range')
+    if incremental_range not in INCREMENTAL_RANGES:
+        return None
+
+    form_id = form["id"]
+    windows = split_range(start_date, end_date, incremental_range)
+    if len(windows) <= 2:
+        return None
+
+    min_responses = int(atx.config.get('shard_min_responses', DEFAULT_SHARD_MIN_RESPONSES))
+    if pending is None:
+        pending = get_response_count(atx, form_id, start_date, end_date)
+    if pending < min_responses:
+        return None
+
+    max_workers = int(atx.config.get('max_workers', 1))
+    max_windows = min(-(-pending // MAX_RESPONSE_PAGE_SIZE), max_workers * WINDOWS_PER_WORKER)
+    windows = merge_windows(windows, max_windows)
+    if len(windows) <= 2:
+        return None
+
+    LOGGER.info('form: {} has {} pending responses, fetching the rest of them as {} windows'.format(
+        form_id, pending, len(windows)))
+    return ResponseShards(form, stream_ids, windows, token_value_last_response)
+
+
+class ResponseShards(object):
+    """The pending responses of one form split into time windows that are
+    fetched concurrently, each with its own since/until/after cursor.
+
+    The form still has a single date_to_resume bookmark, so it only ever
+    moves forward over windows that have been completely written: through the
+    pages of the earliest unfinished window, or to the end of the windows
+    finished before it. Each page is handed to the writer while the lock is
+    held (see iter_window), so a bookmark is always queued after the records
+    it covers and never behind an older one."""
+
+    def __init__(self, form, stream_ids, windows, token_value_last_response):
+        self.form = form
+        self.stream_ids = stream_ids
+        self.windows = windows
+        self.token_value_last_response = token_value_last_response
+        self.resume_points = [None] * len(windows)
+        self.frontier = 0
+        self.lock = threading.Lock()
+
+    def get_bookmark(self, index, resume_point):
+        previous_frontier = self.frontier
+        while self.frontier < len(self.windows) and self.resume_points[self.frontier] is not None:
+            self.frontier += 1
+
+        if self.frontier == len(self.windows):
+            date_to_resume, token_value_last_response = self.resume_points[-1]
+            return {
+                'date_to_resume': date_to_resume,
+                'last_synchronised_response_token': token_value_last_response,
+                'responses_fingerprint': get_responses_fingerprint(self.form)
+            }
+        if index == self.frontier:
+            date_to_resume, token_value_last_response = resume_point
+        elif self.frontier > previous_frontier:
+            date_to_resume, token_value_last_response = self.resume_points[self.frontier - 1]
         else:
-            getForms(atx, get_forms_data)
+            return None
+        return {
+            'date_to_resume': date_to_resume,
+            'last_synchronised_response_token': token_value_last_response
+        }
+
+    def iter_window(self, atx, index):
+        form_id = self.form["id"]
+        window_start, window_end = self.windows[index]
+        # the bookmarked token only applies to the window starting at the bookmark
+        token_value_last_response = self.token_value_last_response if index == 0 else None
+        last_window = index == len(self.windows) - 1
+        # the last window ends where an unsharded sync would
+        window_until = window_end if last_window else get_window_until(window_end)
+
+        for records, max_submitted_at, token_value_last_response, last_page, page_end, _ in iter_responses(
+                atx, form_id, window_start, window_until, token_value_last_response, self.stream_ids):
+            if not page_end:
+                yield FormPage(form_id, records, None)
+                continue
+            resume_point = (max_submitted_at, token_value_last_response)
+            # the consumer puts the page on the writer's queue before asking
+            # for the next one, which is what keeps the lock held until then
+            with self.lock:
+                if last_page:
+                    # apart from the last one, a finished window resumes
+                    # where the next one starts
+                    self.resume_points[index] = resume_point if last_window else (window_end, None)
+                yield FormPage(form_id, records, self.get_bookmark(index, resume_point))
+
+    def jobs(self, atx):
+        return [(self.form["id"], self.iter_window(atx, index)) for index in range(len(self.windows))]
 
 
-def get_forms_data(atx, forms):
+def write_form_page(atx, page):
+    """Writes the records of a page, then its bookmark. Only ever called from
+    the main thread so stdout and state stay consistent."""
+    for stream_id, records in page.records.items():
+        write_records(atx, stream_id, records)
+    if page.bookmark is not None:
+        write_forms_state(atx, page.form_id, page.bookmark)
+
+
+# a form the sync has something to fetch for, the streams it is synced for
+# and how many responses are waiting (None when they weren't counted)
+FormPlan = collections.namedtuple('FormPlan', ['form', 'stream_ids', 'pending_responses'])
+
+
+def plan_forms(atx, forms, stream_ids, count_responses=False):
+    """Works out up front which forms need their responses pulled at all, the
+    ones left with nothing to sync don't cost a single request. With
+    count_responses the pending responses of every form that has some are
+    counted, a page_size=1 request each."""
+    plans = []
+    skipped_responses = 0
+    skipped_questions = 0
     for form in forms:
-        for stream in atx.catalog.streams:
-
-            form_id = form["id"]
-
-            bookmark = atx.state.get('bookmarks', {}).get(form_id, {})
-
-            LOGGER.info('form: {} '.format(form_id))
-
-            # pull back the form question details
-            if stream.tap_stream_id == 'questions':
-                schemas.load_and_write_schema(stream.tap_stream_id)
-                sync_form_definition(atx, form_id)
-
-            # start_date is defaulted in the config file 2018-01-01
-            # if there's no default date and it gets set to now, then start_date will have to be
-            #   set to the prior business day/hour before we can use it.
-
-            now = datetime.datetime.now(pytz.utc)
-            today = now.replace(hour=0, minute=0, second=0, microsecond=0).strftime(DATE_FORMAT)
-
-            start_date = datetime.datetime.strptime(atx.config.get('start_date', today), DATE_FORMAT).replace(hour=0,
-                                                                                                              minute=0,
-                                                                                                              second=0,
-                                                                                                              microsecond=0).strftime(
-                DATE_FORMAT)
-
-            end_date = now + datetime.timedelta(days=1)
-            end_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0).strftime(DATE_FORMAT)
-
-
-            # if the state file has a date_to_resume, we use it as it is.
-            # if it doesn't exist, we overwrite by start date
-            last_date = bookmark.get('date_to_resume', start_date)
-            LOGGER.info('last_date: {} '.format(last_date))
-            LOGGER.info('start_date: {} '.format(last_date))
-            LOGGER.info('end_date: {} '.format(end_date))
-
-            token_value_last_response = bookmark.get('last_synchronised_response_token',
-                                                     None)  # since it is the first call for the current form_id
-            [responses, max_submitted_at, token_value_last_response] = sync_form_data(atx, form_id, last_date, end_date,
-                                                                                      token_value_last_response,
-                                                                                      stream.tap_stream_id)
-            # if the max responses were returned, we have to make the call again
-            # going to increment the max_submitted_at by 1 second so we don't get dupes,
-            # but this also might cause some minor loss of data.
-            # there's no ideal scenario here since the API has no other way than using
-            # time ranges to step through data.
-
-            while responses > RESPONSE_PAGE_SIZE:
-                interim_next_date = max_submitted_at  # + datetime.timedelta(seconds=1) removed the =1 second because we are using the before token filter
-                write_forms_state(atx, form_id, interim_next_date, token_value_last_response)
-                [responses, max_submitted_at, token_value_last_response] = sync_form_data(atx, form_id, interim_next_date,
-                                                                                          end_date,
-                                                                                          token_value_last_response,
-                                                                                          stream.tap_stream_id)
-
-            # if the prior sync is successful it will write the date_to_resume bookmark
-            write_forms_state(atx, form_id, max_submitted_at, token_value_last_response)
-            # token_value_last_response = None
+        form_stream_ids = stream_ids
+        if get_endpoint_stream_ids(form_stream_ids, 'responses') and not has_new_responses(atx, form):
+            form_stream_ids = [stream_id for stream_id in form_stream_ids
+                               if STREAM_ENDPOINTS[stream_id] != 'responses']
+            skipped_responses += 1
+        if get_endpoint_stream_ids(form_stream_ids, 'definition') and not definition_changed(atx, form):
+            form_stream_ids = [stream_id for stream_id in form_stream_ids
+                               if STREAM_ENDPOINTS[stream_id] != 'definition']
+            skipped_questions += 1
+        if not form_stream_ids:
+            continue
+
+        pending_responses = None
+        if count_responses and get_endpoint_stream_ids(form_stream_ids, 'responses'):
+            last_date, end_date, _ = get_responses_range(atx, form["id"])
+            pending_responses = get_response_count(atx, form["id"], last_date, end_date)
+        plans.append(FormPlan(form, form_stream_ids, pending_responses))
+    if skipped_responses:
+        LOGGER.info('skipping responses of {} closed forms with no new responses'.format(skipped_responses))
+    if skipped_questions:
+        LOGGER.info('skipping questions of {} forms not updated since the last sync'.format(skipped_questions))
+    return plans
+
+
+def estimate_requests(atx, plan):
+    """The requests a planned form will take at the largest page size, None
+    when its responses weren't counted."""
+    requests = 1 if get_endpoint_stream_ids(plan.stream_ids, 'definition') else 0
+    if get_endpoint_stream_ids(plan.stream_ids, 'responses'):
+        if plan.pending_responses is None:
+            return None
+        page_size = ResponsePageSize(atx.config).maximum
+        requests += max(1, -(-plan.pending_responses // page_size))
+    return requests
+
+
+def get_forms_data(atx, forms, stream_ids):
+    max_workers = int(atx.config.get('max_workers', 1))
+
+    # with `largest_first` and several workers the biggest forms go first,
+    # so the sync doesn't end on one worker paging through a large form
+    # while the others idle. that takes counting every form's responses
+    # before starting, a request each on this thread, so it is off unless
+    # asked for
+    largest_first = max_workers > 1 and atx.config.get('largest_first', False)
+    plans = plan_forms(atx, forms, stream_ids, count_responses=largest_first)
+    if largest_first:
+        plans.sort(key=lambda plan: plan.pending_responses or 0, reverse=True)
+
+    # very large forms are split into time windows fetched by several
+    # workers at once, which only makes sense with more than one of them
+    jobs = [(plan.form["id"], get_form_pages(atx, plan.form, plan.stream_ids, can_shard=max_workers > 1))
+            for plan in plans]
+
+    write_page = functools.partial(write_form_page, atx)
+    transform_pool = None
+    transform_processes = int(atx.config.get('transform_processes', 0))
+    if transform_processes > 0:
+        from tap_typeform.transform_pool import TransformPool
+        transform_pool = TransformPool(atx, transform_processes)
+        write_page = transform_pool.submit
+    try:
+        # with a transform pool the pages are always fetched on their own
+        # thread, so that fetching carries on while the pool works
+        if max_workers > 1 or transform_pool is not None:
+            sync_forms_concurrently(atx, jobs, max_workers, write_page)
+        else:
+            for form_id, pages in jobs:
+                for page in pages:
+                    write_page(page)
+                atx.output.finish_form(form_id)
+        if transform_pool is not None:
+            transform_pool.flush()
+    finally:
+        if transform_pool is not None:
+            transform_pool.close()
+
+
+class _FormDone(object):
+    def __init__(self, form_id, error=None):
+        self.form_id = form_id
+        self.error = error
+
+
+def sync_forms_concurrently(atx, jobs, max_workers, write_page):
+    """Fetches forms on a pool of worker threads, they all share the client's
+    rate limiter. Each job is a form id and a generator of its FormPages.
+    The workers hand their pages over through a bounded queue and the main
+    thread is the single writer of records and state, through
+    write_page. A job can also yield FormJobs, which are submitted to the
+    pool once everything the job yielded before them has been written."""
+    pages = queue.Queue(maxsize=max_workers * 2)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch_form(form_id, form_pages):
+        if stop.is_set():
+            return
+        try:
+            for page in form_pages:
+                if not put(page):
+                    return
+        except Exception as exc: # pylint: disable=broad-except
+            put(_FormDone(form_id, exc))
+            return
+        finally:
+            form_pages.close()
+        put(_FormDone(form_id))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='form') as executor:
+        try:
+            for form_id, form_pages in jobs:
+                executor.submit(fetch_form, form_id, form_pages)
+            pending = len(jobs)
+            while pending:
+                item = pages.get()
+                if isinstance(item, _FormDone):
+                    if item.error is not None:
+                        LOGGER.error('form: {} failed'.format(item.form_id))
+                        raise item.error
+                    # everything the job yielded has been written by now
+                    atx.output.finish_form(item.form_id)
+                    pending -= 1
+                elif isinstance(item, FormJobs):
+                    for form_id, form_pages in item.jobs:
+                        executor.submit(fetch_form, form_id, form_pages)
+                    pending += len(item.jobs)
+                else:
+                    write_page(item)
+        finally:
+            stop.set()
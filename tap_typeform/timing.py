@@ -0,0 +1,102 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import singer
+from singer import metrics
+
+LOGGER = singer.get_logger()
+
+# the stages a sync spends its time in, in the order they happen
+STAGES = [
+    'rate_limit',     # waiting for the token bucket
+    'backoff',        # waiting to retry after a 429 or 5xx
+    'http',           # sending requests and reading their bodies
+    'json_decode',    # decoding response bodies
+    'build',          # building records from responses
+    'transform',      # applying the stream schemas to records
+    'transform_wait', # waiting on the transform processes
+    'write',          # serialising records and writing them to stdout
+]
+
+
+class StageTimer(object):
+    """Adds up the time spent in each stage of a sync, from any thread."""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(STAGES, 0)
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds, count=1):
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.counts[stage] += count
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def write_metrics(self):
+        """Logs one singer METRIC message per stage."""
+        for stage in STAGES:
+            metrics.log(LOGGER, metrics.Point('timer', 'stage_duration', round(self.seconds[stage], 6),
+                                              {'stage': stage, 'count': self.counts[stage]}))
+
+    def log_summary(self):
+        total = sum(self.seconds.values()) or 1.0
+        LOGGER.info('%-14s %10s %10s %6s', 'stage', 'count', 'seconds', '%')
+        for stage in STAGES:
+            LOGGER.info('%-14s %10d %10.2f %6.1f', stage, self.counts[stage], self.seconds[stage],
+                        100.0 * self.seconds[stage] / total)
+
+
+@contextmanager
+def profiled(config):
+    """Profiles the code run inside it when the `profile` config key is
+    `cprofile` or `pyinstrument`. The report goes to `profile_output` when
+    it is set and to the log otherwise. Only the main thread is profiled."""
+    profiler_name = config.get('profile')
+    if not profiler_name:
+        yield
+        return
+
+    output = config.get('profile_output')
+    if profiler_name == 'cprofile':
+        import cProfile
+        import io
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            else:
+                report = io.StringIO()
+                pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(40)
+                LOGGER.info('profile:\n%s', report.getvalue())
+    elif profiler_name == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise Exception('the pyinstrument profiler is not installed, `pip install pyinstrument`')
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output:
+                with open(output, 'w') as output_file:
+                    output_file.write(profiler.output_html())
+            else:
+                LOGGER.info('profile:\n%s', profiler.output_text())
+    else:
+        raise Exception('unknown profiler {}, use cprofile or pyinstrument'.format(profiler_name))
@@ -0,0 +1,113 @@
+import collections
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import singer
+from singer.catalog import Catalog
+
+from tap_typeform import streams
+from tap_typeform.output import MessageWriter
+
+# the record transform and RECORD message format of each stream, set up once
+# in every worker process
+_worker_streams = {}
+_worker_output = None
+
+
+def init_worker(config, catalog):
+    global _worker_output # pylint: disable=global-statement
+    _worker_output = MessageWriter(config)
+    for catalog_entry in Catalog.from_dict(catalog).streams:
+        transformer = singer.Transformer()
+        _worker_streams[catalog_entry.tap_stream_id] = (
+            transformer, streams.get_record_transform(catalog_entry, transformer))
+
+
+def serialise_page(records, time_extracted):
+    """Serialises the records of every stream of a page in one go. The
+    streams of a page are built from the same responses, sent over to the
+    worker together they are pickled once rather than once per stream."""
+    return [(tap_stream_id, serialise_records(tap_stream_id, stream_records, time_extracted))
+            for tap_stream_id, stream_records in records.items()]
+
+
+def serialise_records(tap_stream_id, records, time_extracted):
+    """Builds, transforms and serialises the records of a page in a worker.
+    Returns the RECORD messages as one string, how many there are, the
+    seconds spent on each stage and the fields the transformer left out."""
+    transformer, transform = _worker_streams[tap_stream_id]
+    prefix, suffix = _worker_output.record_format(tap_stream_id, time_extracted)
+    dumps = _worker_output.dumps
+    build = transform_seconds = write = 0.0
+    lines = []
+    records = iter(records)
+    perf_counter = time.perf_counter
+    while True:
+        started = perf_counter()
+        rec = next(records, None)
+        built = perf_counter()
+        build += built - started
+        if rec is None:
+            break
+        rec = transform(rec)
+        transformed = perf_counter()
+        lines.append(prefix + dumps(rec) + suffix)
+        write += perf_counter() - transformed
+        transform_seconds += transformed - built
+    filtered, removed = set(transformer.filtered), set(transformer.removed)
+    transformer.filtered.clear()
+    transformer.removed.clear()
+    return ''.join(lines), len(lines), (build, transform_seconds, write), filtered, removed
+
+
+class TransformPool(object):
+    """Builds, transforms and serialises the records of FormPages on a pool
+    of `processes` processes, while the pages keep being fetched.
+
+    Pages are written out in the order they were submitted, each one's
+    bookmark right after its records, so the output is the same as when
+    the records are written by write_form_page. Up to two pages per process
+    are in flight at once.
+    """
+
+    def __init__(self, atx, processes):
+        self.atx = atx
+        # spawned rather than forked, the fetching threads are already
+        # running when the pool starts its processes
+        self.executor = ProcessPoolExecutor(max_workers=processes,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=init_worker,
+                                            initargs=(atx.config, atx.catalog.to_dict()))
+        self.pending = collections.deque()
+        self.max_pending = processes * 2
+
+    def submit(self, page):
+        future = None
+        if page.records:
+            future = self.executor.submit(serialise_page, page.records, singer.utils.now())
+        self.pending.append((page, future))
+        while len(self.pending) > self.max_pending:
+            self.write_next()
+
+    def write_next(self):
+        page, future = self.pending.popleft()
+        timer = self.atx.timer
+        serialised = []
+        if future is not None:
+            with timer.time('transform_wait'):
+                serialised = future.result()
+        for tap_stream_id, (text, count, seconds, filtered, removed) in serialised:
+            for stage, stage_seconds in zip(['build', 'transform', 'write'], seconds):
+                timer.add(stage, stage_seconds, count)
+            streams.get_stream_writer(self.atx, tap_stream_id).write_serialised(text, count, filtered, removed)
+        if page.bookmark is not None:
+            streams.write_forms_state(self.atx, page.form_id, page.bookmark)
+
+    def flush(self):
+        while self.pending:
+            self.write_next()
+
+    def close(self):
+        self.pending.clear()
+        self.executor.shutdown(cancel_futures=True)
@@ -0,0 +1,134 @@
+import datetime
+import types
+import unittest
+
+from tap_typeform import streams
+
+DATE_FORMAT = streams.DATE_FORMAT
+
+
+class FakeClient(object):
+    """Serves /responses pages the way the api does: since and until are
+    both inclusive and `after` skips up to a response's token."""
+
+    stream_responses = False
+
+    def __init__(self, submitted_at):
+        self.submitted_at = submitted_at
+        self.requests = []
+
+    def get(self, form_id, params=None, stream_items=False):
+        self.requests.append(params)
+        matching = [n for n, submitted_at in enumerate(self.submitted_at)
+                    if params['since'] <= submitted_at <= params['until']]
+        if 'after' in params:
+            after = int(params['after'])
+            matching = [n for n in matching if n > after]
+        page = matching[:params['page_size']]
+        return {
+            'total_items': len(matching),
+            'items': [{'token': str(n), 'landing_id': str(n), 'submitted_at': self.submitted_at[n],
+                       'answers': [{'type': 'text', 'text': 'answer', 'field': {'id': 'q1', 'type': 'short_text'}}]}
+                      for n in page],
+        }
+
+
+def get_atx(submitted_at):
+    return types.SimpleNamespace(config={'response_page_size': 25}, state={},
+                                 client=FakeClient(submitted_at))
+
+
+def six_hourly(start, count):
+    return [(start + datetime.timedelta(hours=6) * n).strftime(DATE_FORMAT) for n in range(count)]
+
+
+class TestWindows(unittest.TestCase):
+
+    def test_merge_windows_caps_the_count(self):
+        windows = streams.split_range('2020-01-01T00:00:00Z', '2020-03-01T00:00:00Z', 'daily')
+        merged = streams.merge_windows(windows, 7)
+        self.assertLessEqual(len(merged), 7)
+        self.assertEqual(merged[0][0], windows[0][0])
+        self.assertEqual(merged[-1][1], windows[-1][1])
+        for previous, window in zip(merged, merged[1:]):
+            self.assertEqual(previous[1], window[0])
+
+    def test_responses_on_window_boundaries_are_fetched_once(self):
+        # every fourth response is submitted exactly at midnight
+        submitted_at = six_hourly(datetime.datetime(2020, 1, 1), 40)
+        atx = get_atx(submitted_at)
+        windows = streams.split_range('2020-01-01T00:00:00Z', '2020-01-11T00:00:00Z', 'daily')
+        shards = streams.ResponseShards({'id': 'form'}, ['answers'], windows, None)
+
+        landing_ids = []
+        for _, pages in shards.jobs(atx):
+            for page in pages:
+                landing_ids.extend(record['landing_id'] for record in page.records['answers'])
+        self.assertEqual(sorted(landing_ids, key=int), [str(n) for n in range(len(submitted_at))])
+
+
+class TestShardingDecision(unittest.TestCase):
+
+    def get_pages(self, shard_min_responses):
+        submitted_at = six_hourly(datetime.datetime(2020, 1, 1), 3000)
+        atx = get_atx(submitted_at)
+        atx.config.update({'start_date': '2020-01-01T00:00:00Z', 'incremental_range': 'daily',
+                           'max_workers': 4, 'shard_min_responses': shard_min_responses})
+        pages = list(streams.get_form_pages(atx, {'id': 'form'}, ['answers'], can_shard=True))
+        return atx, submitted_at, pages
+
+    def test_the_first_page_decides_and_the_rest_is_sharded(self):
+        atx, submitted_at, pages = self.get_pages(1000)
+        self.assertIsInstance(pages[-1], streams.FormJobs)
+        landing_ids = [record['landing_id'] for page in pages[:-1] for record in page.records['answers']]
+        for _, window_pages in pages[-1].jobs:
+            for page in window_pages:
+                landing_ids.extend(record['landing_id'] for record in page.records['answers'])
+        self.assertEqual(sorted(landing_ids, key=int), [str(n) for n in range(len(submitted_at))])
+        # the total_items of the first page is all it took, nothing was counted
+        self.assertNotIn(1, [params['page_size'] for params in atx.client.requests])
+
+    def test_forms_below_the_minimum_are_paged_through_without_extra_requests(self):
+        atx, submitted_at, pages = self.get_pages(5000)
+        self.assertFalse(any(isinstance(page, streams.FormJobs) for page in pages))
+        self.assertEqual(len(atx.client.requests), -(-len(submitted_at) // 25))
+
+
+class TestBookmarks(unittest.TestCase):
+
+    def get_shards(self):
+        windows = [('2020-01-01T00:00:00Z', '2020-01-02T00:00:00Z'),
+                   ('2020-01-02T00:00:00Z', '2020-01-03T00:00:00Z'),
+                   ('2020-01-03T00:00:00Z', '2020-01-04T00:00:00Z')]
+        return streams.ResponseShards({'id': 'form'}, ['landings'], windows, None)
+
+    def finish(self, shards, index, resume_point):
+        shards.resume_points[index] = resume_point
+        return shards.get_bookmark(index, resume_point)
+
+    def test_bookmark_follows_the_earliest_unfinished_window(self):
+        shards = self.get_shards()
+        self.assertEqual(shards.get_bookmark(0, ('2020-01-01T10:00:00Z', 't1')),
+                         {'date_to_resume': '2020-01-01T10:00:00Z', 'last_synchronised_response_token': 't1'})
+        # pages of later windows can't move the bookmark past window 0
+        self.assertIsNone(shards.get_bookmark(1, ('2020-01-02T10:00:00Z', 't2')))
+        self.assertIsNone(self.finish(shards, 1, ('2020-01-03T00:00:00Z', None)))
+
+    def test_finishing_the_frontier_skips_over_finished_windows(self):
+        shards = self.get_shards()
+        self.assertIsNone(self.finish(shards, 1, ('2020-01-03T00:00:00Z', None)))
+        self.assertEqual(self.finish(shards, 0, ('2020-01-02T00:00:00Z', None)),
+                         {'date_to_resume': '2020-01-03T00:00:00Z', 'last_synchronised_response_token': None})
+        self.assertEqual(shards.frontier, 2)
+
+    def test_last_window_writes_the_final_bookmark(self):
+        shards = self.get_shards()
+        self.finish(shards, 0, ('2020-01-02T00:00:00Z', None))
+        self.finish(shards, 2, ('2020-01-03T20:00:00Z', 't9'))
+        self.assertEqual(self.finish(shards, 1, ('2020-01-03T00:00:00Z', None)),
+                         {'date_to_resume': '2020-01-03T20:00:00Z', 'last_synchronised_response_token': 't9',
+                          'responses_fingerprint': None})
+
+
+if __name__ == '__main__':
+    unittest.main()